@@ -5,6 +5,7 @@ import analysis.hitfinding
 import plotting.line
 import plotting.image
 import utils.reader
+import utils.cache
 
 sim = simulation.simple.Simulation("examples/extra_files/virus.conf")
 sim.hitrate = 0.1
@@ -33,11 +34,12 @@ state = {
 
 # Reading mask
 # ------------
-mreader = utils.reader.MaskReader('examples/extra_files/mask.h5', 'data/data')
+# Files loaded through utils.cache are only read again on reload if they changed
+mreader = utils.cache.load('examples/extra_files/mask.h5', utils.reader.MaskReader, 'data/data')
 
 # Reading geometry
 # ----------------
-greader = utils.reader.GeometryReader('examples/extra_files/geometry.h5')
+greader = utils.cache.load('examples/extra_files/geometry.h5', utils.reader.GeometryReader)
 
 # Reading something else
 # ----------------------
@@ -1,6 +1,7 @@
 import os
 import time
 import utils.reader
+import utils.cache
 import simulation.simple
 import analysis.event
 import analysis.pixel_detector
@@ -89,7 +90,7 @@ sizingParams = {
     'photon_counting':True}
 
 this_dir = os.path.dirname(os.path.realpath(__file__))
-mask = utils.reader.MaskReader(this_dir + "/mask.h5","/data/data").boolean_mask
+mask = utils.cache.load(this_dir + "/mask.h5", utils.reader.MaskReader, "/data/data").boolean_mask
     
 def onEvent(evt):
 
@@ -3,6 +3,7 @@ import time
 import numpy
 import ipc
 import utils.reader
+import utils.cache
 import simulation.simple
 import analysis.event
 import analysis.pixel_detector
@@ -104,7 +105,7 @@ ny = sim.ny
 
 # Loading of mask
 # ---------------
-mask = utils.reader.MaskReader(this_dir + "/mask.h5","/data/data").boolean_mask
+mask = utils.cache.load(this_dir + "/mask.h5", utils.reader.MaskReader, "/data/data").boolean_mask
 
 # Error logging histories
 # -----------------------
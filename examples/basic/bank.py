@@ -0,0 +1,56 @@
+# Import analysis/plotting modules
+import analysis.event
+import analysis.pixel_detector
+import plotting.line
+import numpy as np
+
+# Specify the facility
+state = {}
+state['Facility'] = 'Dummy'
+
+# Create a dummy facility which cycles through a bank of
+# pre-generated frames, to test the analysis at high rates
+state['Dummy'] = {
+    # The event repetition rate of the dummy facility [Hz]
+    'Repetition Rate' : 1000,
+    # Number of frames generated for every data source
+    'Bank Size': 8,
+    # Dictionary of data sources
+    'Data Sources': {
+        # A pnCCD sized detector
+        'pnCCD': {
+            # Shape and type of the frames, which are
+            # filled with Poisson distributed counts
+            'shape': (1024, 1024),
+            'dtype': np.float32,
+            'mean': 0.1,
+            'unit': 'ADU',
+            'type': 'photonPixelDetectors'
+        },
+        # A CsPad sized detector
+        'CsPad': {
+            'shape': (32, 185, 388),
+            'dtype': np.int16,
+            'unit': 'ADU',
+            'type': 'photonPixelDetectors'
+        },
+        # Sources given by a function are called 'Bank Size' times
+        'pulseEnergy1': {
+            'data': lambda: np.random.rand(),
+            'unit': 'J',
+            'type': 'pulseEnergies'
+        }
+    }
+}
+
+# This function is called for every single event
+# following the given recipy of analysis
+def onEvent(evt):
+
+    # Processin rate [Hz]
+    analysis.event.printProcessingRate()
+
+    # Count the photons on the pnCCD, in benchmarks the frames are
+    # shared between events and must not be modified
+    analysis.pixel_detector.totalNrPhotons(evt, evt['photonPixelDetectors']['pnCCD'], aduPhoton=1)
+    plotting.line.plotHistory(evt['analysis']['nrPhotons'])
@@ -0,0 +1,41 @@
+# Import analysis modules
+import analysis.hitfinding
+import analysis.pixel_detector
+import numpy as np
+
+# Specify the facility
+state = {}
+state['Facility'] = 'Dummy'
+
+# Number of events analysed together in onBatch
+state['batch_size'] = 20
+
+# Create a dummy facility
+state['Dummy'] = {
+    # The event repetition rate of the dummy facility [Hz]
+    'Repetition Rate' : 100,
+    # Dictionary of data sources
+    'Data Sources': {
+        'CCD': {
+            'data': lambda: np.random.rand(256,256),
+            'unit': 'ADU',
+            'type': 'photonPixelDetectors'
+        }
+    }
+}
+
+# This function is called for every batch of events
+# following the given recipy of analysis
+def onBatch(batch):
+
+    # The data of all events in the batch is stacked along the first axis
+    ccd = batch["photonPixelDetectors"]["CCD"]
+
+    # Simple hit finding (counting the number of lit pixels) for all events at once
+    analysis.hitfinding.countLitPixelsBatch(batch, ccd, aduThreshold=0.99, hitscoreThreshold=660)
+
+    # Total nr. of photons for all events at once
+    analysis.pixel_detector.totalNrPhotonsBatch(batch, ccd, aduThreshold=0.5)
+
+    hits = batch["analysis"]["litpixel: isHit"].data
+    print "%d hits in a batch of %d events" % (hits.sum(), len(batch))
@@ -0,0 +1,38 @@
+# Import analysis/plotting modules
+import analysis.event
+import analysis.pixel_detector
+import plotting.line
+import plotting.image
+
+# Specify the facility
+state = {}
+state['Facility'] = 'CXI'
+
+# Read the frames of CXI files, e.g. written by utils.cxiwriter.CXIWriter
+state['CXI'] = {
+    # The files to read, a list or a glob pattern
+    'Files': '*.cxi',
+    # Minimum number of frames read from the files at once
+    'Block Size': 32,
+    # Dictionary of data sources. Without it the frames
+    # in entry_1/data_1/data are translated as the CCD
+    'Data Sources': {
+        'CCD': {
+            'dataset': 'entry_1/data_1/data',
+            'unit': 'ADU',
+            'type': 'photonPixelDetectors'
+        }
+    }
+}
+
+# This function is called for every single event
+# following the given recipy of analysis
+def onEvent(evt):
+
+    # Processin rate [Hz]
+    analysis.event.printProcessingRate()
+
+    # Count the photons on the CCD and visualize it
+    analysis.pixel_detector.totalNrPhotons(evt, evt['photonPixelDetectors']['CCD'], aduPhoton=1)
+    plotting.line.plotHistory(evt['analysis']['nrPhotons'])
+    plotting.image.plotImage(evt['photonPixelDetectors']['CCD'])
@@ -0,0 +1,47 @@
+# Import analysis/plotting modules
+import analysis.event
+import plotting.line
+import plotting.image
+
+# Specify the facility
+state = {}
+state['Facility'] = 'Replay'
+
+# Replay the hits recorded by analysis.recorder.Recorder
+state['Replay'] = {
+    # The files to replay, a list or a glob pattern
+    'Files': 'hits_*.h5',
+    # Dictionary of data sources, the datasets of the files
+    # which are translated for every event
+    'Data Sources': {
+        # The name of the data source
+        'CCD': {
+            # The dataset, whose first axis is the event
+            'dataset': 'entry_1/data',
+            # The units to be used
+            'unit': 'ADU',
+            # The name of the category for this data source
+            'type': 'photonPixelDetectors'
+        },
+        'diameter': {
+            'dataset': 'analysis/diameter',
+            'unit': 'm',
+            'type': 'parameters'
+        }
+    }
+}
+
+# This function is called for every single event
+# following the given recipy of analysis
+def onEvent(evt):
+
+    # Processin rate [Hz]
+    analysis.event.printProcessingRate()
+
+    # The recorded LCLS time, if the files have one
+    if 'eventID' in evt.keys():
+        plotting.line.plotTimestamp(evt['eventID']['Timestamp'])
+
+    # Visualize the recorded hits and their sizes
+    plotting.image.plotImage(evt['photonPixelDetectors']['CCD'])
+    plotting.line.plotHistory(evt['parameters']['diameter'])
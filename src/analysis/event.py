@@ -2,24 +2,17 @@
 # Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
 # Hummingbird is distributed under the terms of the Simplified BSD License.
 # -------------------------------------------------------------------------
-import collections
-import datetime
 import ipc
-import numpy as np
 from backend import EventTranslator
 
-processingTimes = collections.deque([], 100)
+processingRate = ipc.counter.WindowedCounter("processingRate", window=100)
 def printProcessingRate():
-    """Prints processing rate to screen"""
-    processingTimes.appendleft(datetime.datetime.now())
-    if(len(processingTimes) < 2):
+    """Prints processing rate, summed over all workers, to screen"""
+    processingRate.add()
+    if(processingRate.timestamp is None):
         return
-    dt = processingTimes[0] - processingTimes[-1]
-    proc_rate = np.array((len(processingTimes)-1)/dt.total_seconds())
-    ipc.mpi.sum("processingRate", proc_rate)
-    proc_rate = proc_rate[()]
     if(ipc.mpi.is_main_worker()):
-        print 'Processing Rate %.2f Hz' % proc_rate
+        print 'Processing Rate %.2f Hz' % processingRate.rate
 
 def printKeys(evt, group=None):
     """prints available keys of Hummingbird events"""
@@ -4,7 +4,6 @@
 # -------------------------------------------------------------------------
 import ipc
 import numpy as np
-import collections
 from backend import add_record
 
 hitrate_counters = {}
@@ -50,14 +49,14 @@ def hitrate(evt, hit, history=100, unit='percent', outkey="hitrate"):
         Tomas Ekeberg
     """
     global hitrate_counters
-    if outkey not in hitrate_counters or hitrate_counters[outkey].maxlen != history:
-        hitrate_counters[outkey] = collections.deque([], history)
-    hitrate_counters[outkey].append(bool(hit))
-    hitcount = np.array(hitrate_counters[outkey].count(True))
-    ipc.mpi.sum("hitcount - " + outkey, hitcount)
+    if outkey not in hitrate_counters or hitrate_counters[outkey].window != history:
+        hitrate_counters[outkey] = ipc.counter.WindowedCounter("hitcount - " + outkey, window=history)
+    counter = hitrate_counters[outkey]
+    counter.add(bool(hit))
     v = evt["analysis"]
     if (ipc.mpi.is_main_worker()):
-        hitrate = hitcount[()] / (ipc.mpi.nr_workers() * float(len(hitrate_counters[outkey])))
+        # Merged over all workers every few events
+        hitrate = counter.fraction
         if unit == 'fraction':
             add_record(v, "analysis", outkey, hitrate)
         elif unit == 'percent':
@@ -90,6 +89,36 @@ def countLitPixels(evt, record, aduThreshold=20, hitscoreThreshold=200, hitscore
     add_record(v, "analysis", outkey + "isMiss", int(not hit and (hitscore > hitscoreDark)))
     add_record(v, "analysis", outkey + "hitscore", hitscore)
 
+def countLitPixelsBatch(batch, record, aduThreshold=20, hitscoreThreshold=200, hitscoreDark=0, hitscoreMax=None, mask=None, outkey="litpixel: "):
+    """Batch version of :func:`countLitPixels`, counting the lit pixels of all the
+    events in a batch in one go. The results are arrays with one entry per event, added to
+    ``batch["analysis"][outkey + "isHit"]``,  ``batch["analysis"][outkey + "isMiss"]``,
+    and ``batch["analysis"][outkey + "hitscore"]``.
+
+    Args:
+        :batch:     The batch variable
+        :record:    A stacked pixel detector ``Record`` of the batch
+
+    Kwargs:
+        :aduThreshold(int):      only pixels above this threshold (in ADUs) are valid, default=20
+        :hitscoreThreshold(int): events with hitscore (Nr. of lit pixels)  above this threshold are hits, default=200
+        :mask(int, bool):        only use masked pixel (mask == True or 1) for counting
+        :outkey(str):            Prefix of data key of resulting ``Record``, default is "litpixel: "
+    """
+    data = record.data
+    if mask is None:
+        data = data.reshape((data.shape[0], -1))
+    else:
+        data = data[:, np.asarray(mask, dtype=bool)]
+    hitscore = (data > aduThreshold).sum(axis=1)
+    hit = (hitscore > hitscoreThreshold).astype(int)
+    if hitscoreMax is not None:
+        hit *= (hitscore <= hitscoreMax)
+    v = batch["analysis"]
+    add_record(v, "analysis", outkey + "isHit", hit)
+    add_record(v, "analysis", outkey + "isMiss", ((hit == 0) & (hitscore > hitscoreDark)).astype(int))
+    add_record(v, "analysis", outkey + "hitscore", hitscore)
+
 def countTof(evt, record, signalThreshold=1, minWindow=0, maxWindow=-1, hitscoreThreshold=2, outkey="tof: "):
     """A simple hitfinder that performs a peak counting test on a time-of-flight detector signal, in a specific subwindow and adds the result to ``evt["analysis"][outkey + "isHit"]``, and  the hitscore to ``evt["analysis"][outkey + "hitscore"]``.
 
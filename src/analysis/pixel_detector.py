@@ -100,6 +100,25 @@ def totalNrPhotons(evt, record, aduPhoton=1, aduThreshold=0.5, outkey=None):
     valid = data > aduThreshold
     add_record(evt["analysis"], "analysis", outkey, sum(data[valid]) / float(aduPhoton))
 
+def totalNrPhotonsBatch(batch, record, aduPhoton=1, aduThreshold=0.5, outkey=None):
+    """Batch version of :func:`totalNrPhotons`, estimating the total nr. of photons for all
+    the events in a batch in one go. Adds an array with one entry per event to ``batch["analysis"][outkey]``.
+
+    Args:
+        :batch:     The batch variable
+        :record:    The stacked data record (e.g. batch['photonPixelDetectors']['CCD'])
+
+    Kwargs:
+        :aduPhoton(int):    ADU count per photon, default = 1
+        :aduThreshold(int): only pixels above this threshold given in units of ADUs are valid, default = 0.5
+        :outkey(str):       Data key of resulting data record, default is 'nrPhotons'
+    """
+    if outkey is None:
+        outkey = 'nrPhotons'
+    data = record.data.reshape((record.data.shape[0], -1))
+    nr_photons = np.where(data > aduThreshold, data, 0).sum(axis=1) / float(aduPhoton)
+    add_record(batch["analysis"], "analysis", outkey, nr_photons)
+
 def maxPhotonValue(evt, record, aduPhoton=1, outkey=None):
     """Estimates the maximum number of photons on one pixel on the detector and adds it to ``evt["analysis"][outkey]``.
 
@@ -122,6 +141,7 @@ def maxPhotonValue(evt, record, aduPhoton=1, outkey=None):
 
 def threshold(evt, record, threshold, outkey=None):
     """Set all values in an array that are lower than the threshold to zero.
+    Works in the same way with a batch and a stacked record, thresholding all events at once.
     
     Args:
         :evt:       The event variable
@@ -5,7 +5,8 @@ package."""
 from .pint import UnitRegistry
 from .worker import Worker # pylint: disable=unused-import
 from .event_translator import EventTranslator # pylint: disable=unused-import
-from .record import Record, add_record # pylint: disable=unused-import
+from .event_batch import EventBatch # pylint: disable=unused-import
+from .record import Record, TimestampRecord, add_record # pylint: disable=unused-import
 
 ureg = UnitRegistry()
 ureg.enable_contexts('spectroscopy')
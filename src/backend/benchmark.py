@@ -0,0 +1,44 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Runs the backend on a fixed number of events, as fast as possible, and
+reports how it performed. Started with ``hummingbird.py --benchmark conf.py -n N``."""
+import json
+import time
+import resource
+import ipc
+from backend.worker import Worker
+
+def run(config_file, port, nr_events):
+    """Runs the configuration on nr_events events per rank and prints
+    the results of every rank as a line of JSON."""
+    worker = Worker(config_file, port)
+    # No rate limit on the dummy translator, and keep all the timings
+    Worker.state['benchmark'] = True
+    Worker.state['max_events'] = nr_events
+    Worker.state['stats_interval'] = None
+    ipc.stats.keep_samples = True
+    t0 = time.time()
+    worker.start()
+    print json.dumps(results(worker.nr_events, time.time() - t0), sort_keys=True)
+
+def results(nr_events, seconds):
+    """Returns the rate, the latency percentiles of every stage
+    and the peak memory use of this rank"""
+    stages = {}
+    for name, stage in ipc.stats.stages.items():
+        p50, p90, p99 = ipc.stats.percentiles(name)
+        stages[name] = {'count': stage.count,
+                        'skipped': stage.skipped,
+                        'p50_ms': p50,
+                        'p90_ms': p90,
+                        'p99_ms': p99,
+                        'max_ms': 1000.*stage.max}
+    return {'rank': ipc.mpi.rank,
+            'events': nr_events,
+            'seconds': seconds,
+            'events_per_s': nr_events/seconds if seconds > 0 else None,
+            # ru_maxrss is given in kB on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.,
+            'stages': stages}
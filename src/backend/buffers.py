@@ -0,0 +1,47 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Reuses the arrays translators write detector data into"""
+import sys
+import threading
+import numpy
+
+class BufferPool(object):
+    """Hands out arrays for the data of a given source, reusing the arrays
+    of previous events instead of allocating new ones.
+
+    An array is only handed out again once nothing but the pool refers to it,
+    i.e. once the Records and events it was given to are gone. Analysis code
+    which keeps a frame beyond its event (e.g. in a list or as the result of
+    an operation returning a view) therefore keeps it from being overwritten,
+    without having to copy it. Keeping a copy (as analysis.stack.Stack does)
+    lets the array be reused.
+
+    Args:
+        max_buffers (int): The maximum number of arrays kept per source, shape and dtype
+    """
+    def __init__(self, max_buffers=8):
+        self._max_buffers = max_buffers
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def get(self, source, shape, dtype):
+        """Returns an array of the given shape and dtype for the data of source.
+        Its content is undefined."""
+        key = (source, tuple(shape), numpy.dtype(dtype))
+        with self._lock:
+            buffers = self._buffers.setdefault(key, [])
+            for buf in buffers:
+                # Referred to by the list, buf and the argument of getrefcount
+                if sys.getrefcount(buf) <= 3:
+                    return buf
+            buf = numpy.empty(shape, dtype)
+            if len(buffers) < self._max_buffers:
+                buffers.append(buf)
+            return buf
+
+    def clear(self):
+        """Forgets all the arrays"""
+        with self._lock:
+            self._buffers.clear()
@@ -0,0 +1,48 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Reads events from CXI files, e.g. written by utils.cxiwriter.CXIWriter"""
+from backend.replay import ReplayTranslator
+
+class CXITranslator(ReplayTranslator):
+    """Reads events from CXI (or any HDF5) files, whose datasets have the
+    event as first axis, without needing psana.
+
+    The options are given in ``state['CXI']``, like for the replay translator
+    (see backend.replay.ReplayTranslator). Only the files are required::
+
+        state['Facility'] = 'CXI'
+        state['CXI'] = {
+            'Files': '/scratch/cxi/r0203_*.cxi',
+        }
+
+    By default the frames in ``entry_1/data_1/data`` are translated as the
+    ``CCD`` of ``photonPixelDetectors``. Other datasets are mapped to
+    hummingbird keys through ``state['CXI']['Data Sources']``, e.g.::
+
+        'Data Sources': {
+            'CCD': {
+                'dataset': 'entry_1/instrument_1/detector_1/data',
+                'unit': 'ADU',
+                'type': 'photonPixelDetectors'
+            },
+            'translation': {
+                'dataset': 'entry_1/sample_1/geometry_1/translation',
+                'unit': 'm',
+                'type': 'parameters'
+            }
+        }
+
+    Every rank reads a contiguous block of events, a whole number of HDF5
+    chunks (at least ``state['CXI']['Block Size']`` frames) at a time, or
+    directly from the file if the dataset is stored contiguously.
+    """
+    state_key = 'CXI'
+    default_sources = {
+        'CCD': {
+            'dataset': 'entry_1/data_1/data',
+            'unit': 'ADU',
+            'type': 'photonPixelDetectors'
+        }
+    }
@@ -7,7 +7,6 @@ import time
 import random
 from backend.event_translator import EventTranslator
 from backend.record import add_record
-from backend import Worker
 from . import ureg
 import numpy
 import ipc
@@ -20,14 +19,18 @@ class DummyTranslator(object):
         self.keys = set()
         self.keys.add('analysis')
         self._last_event_time = -1
-        pass
+        # The state['Dummy'] the units and banks below were made for
+        self._conf = None
+        self._units = {}
+        self._banks = {}
+        self._n = 0
 
     def next_event(self):
         """Generates and returns the next event"""
         evt = {}        
         
-        # Check if we need to sleep
-        if(self._last_event_time > 0):
+        # Check if we need to sleep, unless benchmarking
+        if(self._last_event_time > 0 and not self.state.get('benchmark', False)):
             rep_rate = 1
             if('Dummy' in self.state and 'Repetition Rate' in self.state['Dummy']):
                 rep_rate = self.state['Dummy']['Repetition Rate'] / float(ipc.mpi.nr_workers())
@@ -47,20 +50,54 @@ class DummyTranslator(object):
         if('Dummy' in self.state and 'Simulation' in self.state['Dummy']):
             self.state['Dummy']['Simulation'].next_event()
 
-        try:
-            for ds in self.state['Dummy']['Data Sources']:
-                evt[ds] = self.state['Dummy']['Data Sources'][ds]['data']()
-                self.keys.add(self.state['Dummy']['Data Sources'][ds]['type'])
+        # The configuration was (re)loaded
+        if self.state['Dummy'] is not self._conf:
+            self._setup()
 
+        try:
+            for ds, source in self._conf['Data Sources'].items():
+                if ds in self._banks:
+                    bank = self._banks[ds]
+                    evt[ds] = bank[self._n % len(bank)]
+                    # Only benchmarks get views of the bank, without copying
+                    if not self.state.get('benchmark', False):
+                        evt[ds] = evt[ds].copy()
+                else:
+                    evt[ds] = self._generate(source)
         except (IndexError, StopIteration) as e:
-            logging.warning('End of Run.')
-            if 'end_of_run' in dir(Worker.conf):
-                Worker.conf.end_of_run()
-            ipc.mpi.slave_done()
             return None
+        self._n += 1
 
         return EventTranslator(evt, self)
 
+    def _setup(self):
+        """Parses the units of the data sources of state['Dummy'] and, if
+        'Bank Size' is given, generates the bank of frames of every source"""
+        self._conf = self.state['Dummy']
+        self._units = {}
+        self._banks = {}
+        bank_size = self._conf.get('Bank Size', None)
+        for ds, source in self._conf['Data Sources'].items():
+            # If unit is a string translate into PINT quantity
+            u = source['unit']
+            if not isinstance(u, ureg.Quantity):
+                u = ureg.parse_expression(u)
+            self._units[ds] = u
+            self.keys.add(source['type'])
+            if bank_size is not None:
+                bank = numpy.array([self._generate(source) for _ in range(bank_size)])
+                # Benchmarks get views of the bank, which must not be modified
+                bank.flags.writeable = False
+                self._banks[ds] = bank
+
+    def _generate(self, source):
+        """Returns a frame of the given data source"""
+        if 'data' in source:
+            return source['data']()
+        # Poisson distributed counts of the given shape and dtype
+        frame = numpy.random.poisson(source.get('mean', 1.), source['shape'])
+        return frame.astype(source.get('dtype', numpy.float64))
+
     def event_keys(self, _):
         """Returns the translated keys available"""
         return list(self.keys)
@@ -81,13 +118,9 @@ class DummyTranslator(object):
                 raise RuntimeError('%s not found in event' % (key))
             return values
         
-        for ds in self.state['Dummy']['Data Sources']:
-            if self.state['Dummy']['Data Sources'][ds]['type'] == key:
-                # If unit is a string translate into PINT quantity
-                u = self.state['Dummy']['Data Sources'][ds]['unit']
-                if not isinstance(self.state['Dummy']['Data Sources'][ds]['unit'],ureg.Quantity):
-                    u = ureg.parse_expression(u)
-                add_record(values, key, ds, evt[ds], u)
+        for ds in self._conf['Data Sources']:
+            if self._conf['Data Sources'][ds]['type'] == key:
+                add_record(values, key, ds, evt[ds], self._units[ds])
         if(values == {} and not key == 'analysis'):
             raise RuntimeError('%s not found in event' % (key))
         return values
@@ -0,0 +1,88 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Groups several events such that they can be analysed together."""
+import numpy
+from backend.record import Record
+
+class EventBatch(object):
+    """Groups several events such that they can be analysed together.
+
+    The batch argument of onBatch(), which can be defined in a
+    configuration file instead of onEvent(), is an EventBatch.
+    It behaves like an event, but the data of every Record is the
+    data of all the events in the batch stacked along a new first axis.
+    Stacking is done only for the Records that are actually accessed.
+    The individual events are available by iterating over the batch.
+    """
+    def __init__(self, events):
+        self.events = events
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __setitem__(self, key, value):
+        self._cache[key] = value
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            self._cache[key] = self._stack(key)
+        return self._cache[key]
+
+    def _stack(self, key):
+        """Returns a dict of Records stacking the data of all events"""
+        records = [evt[key] for evt in self.events]
+        if not isinstance(records[0], dict):
+            # Dict-like values, e.g. the EPICSdict of LCLS,
+            # are stacked as their Records are accessed
+            return StackedDict(records)
+        values = {}
+        for name in records[0]:
+            values[name] = _stack_record(records, name)
+        return values
+
+    def keys(self):
+        """Returns the translated keys available in the first event"""
+        return self.events[0].keys()
+
+    def event_id(self):
+        """Returns the id of the last event in the batch"""
+        return self.events[-1].event_id()
+
+    def event_id2(self):
+        """Returns the alternative id of the last event in the batch"""
+        return self.events[-1].event_id2()
+
+    def event_ids(self):
+        """Returns an array with the ids of all the events in the batch"""
+        return numpy.array([evt.event_id() for evt in self.events])
+
+
+class StackedDict(object):
+    """Provides a dict-like interface to the Records of dict-like values
+    of all the events of a batch, stacking them when they are accessed"""
+    def __init__(self, records):
+        self._records = records
+        self._cache = {}
+
+    def keys(self):
+        """Returns the names available in the first event"""
+        return self._records[0].keys()
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            self._cache[name] = _stack_record(self._records, name)
+        return self._cache[name]
+
+def _stack_record(records, name):
+    """Returns a Record stacking the data of the Records called name"""
+    rec = records[0][name]
+    if rec is None:
+        return None
+    data = lambda: numpy.array([r[name].data for r in records])
+    return Record(rec.name, data, rec.unit)
@@ -3,6 +3,8 @@
 # Hummingbird is distributed under the terms of the Simplified BSD License.
 # -------------------------------------------------------------------------
 """Provides the interface between the analysis code and the various translators."""
+import time
+import ipc
 
 class EventTranslator(object):
     """Provides the interface between the analysis code and the various
@@ -28,15 +30,48 @@ class EventTranslator(object):
         
     def __getitem__(self, key):
         if key not in self._cache:
-            self._cache[key] = self._trans.translate(self._evt, key)
+            t0 = time.time()
+            values = self._trans.translate(self._evt, key)
+            # Only keep the sources declared in state['keys'], if any
+            names = self._declared().get(key)
+            if names is not None and isinstance(values, dict):
+                values = dict([(n, values[n]) for n in names if n in values])
+            self._cache[key] = values
+            ipc.stats.add('translate(%s)' % key, time.time() - t0)
         return self._cache[key]
 
     def keys(self):
-        """Returns the translated keys available"""
+        """Returns the translated keys available, only those declared
+        in state['keys'] if the configuration declares them"""
         if self._trans_keys is None:
             self._trans_keys = self._trans.event_keys(self._evt)
+            declared = self._declared()
+            if declared:
+                self._trans_keys = [k for k in self._trans_keys
+                                    if k in declared or k == 'analysis']
         return self._trans_keys + self._new_keys
 
+    def warm(self):
+        """Translates all the keys declared in state['keys'] at once,
+        including the data of their lazily translated Records, such that
+        it is read on the prefetching thread, if any. Keys missing in this
+        event are skipped."""
+        for key in self._declared():
+            try:
+                values = self[key]
+            except (KeyError, RuntimeError):
+                continue
+            if isinstance(values, dict):
+                for rec in values.values():
+                    if rec is not None:
+                        rec.data # pylint: disable=pointless-statement
+
+    def _declared(self):
+        """Returns the keys, and lists of source names (or None for all
+        of them), that the configuration declared it uses"""
+        state = getattr(self._trans, 'state', None) or {}
+        return state.get('keys') or {}
+
     def native_keys(self):
         """Returns the keys, with facility specific names, available"""
         if self._native_keys is None:
@@ -5,14 +5,14 @@
 """Translates between LCLS events and Hummingbird ones"""
 import os
 import logging
+import functools
+import threading
 from backend.event_translator import EventTranslator
-from backend.record import Record, add_record
+from backend.record import Record, TimestampRecord, add_record
+from backend.buffers import BufferPool
 import psana
 import numpy
-import datetime
-from pytz import timezone
 from . import ureg
-from backend import Worker
 import ipc
 from hummingbird import parse_cmdline_args
 
@@ -38,11 +38,27 @@ def add_cmdline_args(parser):
 
     return argparser
     
+def _locked(method):
+    """Decorates a method of LCLSTranslator which calls psana, such that
+    it holds the lock of the translator"""
+    @functools.wraps(method)
+    def call(self, *args):
+        with self.lock:
+            return method(self, *args)
+    return call
+
 class LCLSTranslator(object):
-    """Translate between LCLS events and Hummingbird ones"""
+    """Translate between LCLS events and Hummingbird ones.
+
+    psana is not thread safe. All the calls to psana, including those of
+    the lazily translated Records, hold the lock of the translator, such
+    that events can be read ahead on another thread (see backend.prefetch).
+    """
     def __init__(self, state):
         self.timestamps = None
         self.library = 'psana'
+        self.lock = threading.RLock()
+        self.state = state
         config_file = None
         if('LCLS/PsanaConf' in state):
             config_file = os.path.abspath(state['LCLS/PsanaConf'])
@@ -77,8 +93,21 @@ class LCLSTranslator(object):
         if cmdline_args.lcls_run_number is not None:
             dsrc += ":run=%i" % cmdline_args.lcls_run_number
 
+        # Number of events read ahead on a background thread when reading
+        # events by time, where every event is a random access into the files
+        self.lookahead = 0
+        if 'times' in state or 'indexing' in state:
+            if 'LCLS/LookAhead' in state:
+                self.lookahead = state['LCLS/LookAhead']
+            elif('LCLS' in state and 'LookAhead' in state['LCLS']):
+                self.lookahead = state['LCLS']['LookAhead']
+
         # Cache times of events that shall be extracted from XTC (does not work for stream)
         self.event_slice = slice(0,None,1)
+        # Request chunks of events from the master instead of striding through them
+        self.work_chunk = state.get('work_queue', None)
+        self.work_offset = 0
+        self.i_stop = 0
         if 'times' in state or 'fiducials' in state:
             if not ('times' in state and 'fiducials' in state):
                 raise ValueError("Times or fiducials missing in state."
@@ -96,16 +125,23 @@ class LCLSTranslator(object):
         elif 'indexing' in state:
             if dsrc[-len(':idx'):] != ':idx':
                 dsrc += ':idx'
-            if 'index_offset' in state:
-                self.i = state['index_offset'] / ipc.mpi.nr_workers()
-            else:
-                self.i = 0
+            self.i = 0
             self.data_source = psana.DataSource(dsrc)
             self.run = self.data_source.runs().next()
             self.timestamps = self.run.times()
             if self.N is not None:
                 self.timestamps = self.timestamps[:self.N]
-            self.timestamps = self.timestamps[ipc.mpi.slave_rank()::ipc.mpi.nr_workers()]
+            if self.work_chunk:
+                self.work_offset = state.get('index_offset', 0)
+            else:
+                # Every rank reads a contiguous block of events, such that
+                # consecutive reads stay within the same chunk of the XTC files
+                self.timestamps = self.timestamps[state.get('index_offset', 0):]
+                nr_events = len(self.timestamps)
+                rank = ipc.mpi.slave_rank()
+                nr_workers = ipc.mpi.nr_workers()
+                self.timestamps = self.timestamps[nr_events*rank//nr_workers:
+                                                  nr_events*(rank+1)//nr_workers]
         else:
             self.times = None
             self.fiducials = None
@@ -156,6 +192,43 @@ class LCLSTranslator(object):
             self._c2n[v] = self._c2n.get(v, [])
             self._c2n[v].append(k)
 
+        # Define which method translates each LCLS type
+        self._dispatch = {}
+        self._dispatch[psana.Bld.BldDataFEEGasDetEnergy] = self._tr_bld_data_fee_gas_det_energy
+        self._dispatch[psana.Bld.BldDataFEEGasDetEnergyV1] = self._tr_bld_data_fee_gas_det_energy
+        self._dispatch[psana.Lusi.IpmFexV1] = self._tr_lusi_ipm_fex
+        for native_type in self._c2n.get('photonEnergies', []):
+            self._dispatch[native_type] = self._tr_bld_data_ebeam
+        self._dispatch[psana.CsPad2x2.ElementV1] = self._tr_cspad2x2
+        self._dispatch[psana.CsPad.DataV2] = self._tr_cspad
+        # AMO
+        self._dispatch[psana.PNCCD.FullFrameV1] = self._tr_pnccdFullFrame
+        self._dispatch[psana.PNCCD.FramesV1] = self._tr_pnccdFrames
+        # --
+        self._dispatch[psana.Acqiris.DataDescV1] = self._tr_acqiris
+        self._dispatch[psana.Camera.FrameV1] = self._tr_camera
+        self._dispatch[psana.EventId] = self._tr_event_id
+        for native_type in self._c2n.get('eventCodes', []):
+            self._dispatch[native_type] = self._tr_event_codes
+
+        # Types whose record names start with the name of their source
+        self._source_named = set([psana.CsPad.DataV2, psana.PNCCD.FullFrameV1,
+                                  psana.PNCCD.FramesV1, psana.Acqiris.DataDescV1])
+
+        # The event keys of the last event, by hummingbird key
+        self._index = (None, None)
+        # Arrays the translated data of previous events was written to
+        self._buffers = BufferPool()
+        # Configuration and calibration of the Acqiris of each source
+        self._acqiris = {}
+        # EPICS names and values of the current run, and the PVs to translate on every event
+        self._epics = None
+        self._epics_pvs = []
+        if 'LCLS/EpicsPVs' in state:
+            self._epics_pvs = state['LCLS/EpicsPVs']
+        elif('LCLS' in state and 'EpicsPVs' in state['LCLS']):
+            self._epics_pvs = state['LCLS']['EpicsPVs']
+
         # Define how to translate between LCLS sources and Hummingbird ones
         self._s2c = {}
         # CXI (OnAxis Cam)
@@ -188,32 +261,29 @@ class LCLSTranslator(object):
         self._s2c['DetInfo(CxiEndstation.0:Acqiris.1)'] = 'Acqiris 1'
 
 
+    @_locked
     def next_event(self):
         """Grabs the next event and returns the translated version"""
-        if self.timestamps:            
+        if self.timestamps is not None:
+            i = self._next_index(len(self.timestamps))
+            if i is None:
+                return None
             try:
-                evt = self.run.event(self.timestamps[self.i])
+                evt = self.run.event(self.timestamps[i])
             except (IndexError, StopIteration) as e:
-                logging.warning('End of Run.')
-                if 'end_of_run' in dir(Worker.conf):
-                    Worker.conf.end_of_run()
-                ipc.mpi.slave_done()
                 return None
-            self.i += 1
         elif self.times is not None:
             evt = None
-            while self.i < len(self.times) and evt is None:
-                time = psana.EventTime(int(self.times[self.i]), self.fiducials[self.i])
-                self.i += 1
+            while evt is None:
+                i = self._next_index(len(self.times))
+                if i is None:
+                    break
+                time = psana.EventTime(int(self.times[i]), self.fiducials[i])
                 evt = self.run.event(time)
                 if evt is None:
                     print "Unable to find event listed in index file"                    
             # We got to the end without a valid event, time to call it a day
             if evt is None:
-                logging.warning('End of Run.')
-                if 'end_of_run' in dir(Worker.conf):
-                    Worker.conf.end_of_run()
-                ipc.mpi.slave_done()
                 return None
         else:
             try:
@@ -225,41 +295,63 @@ class LCLSTranslator(object):
                 evt = self.data_source.events().next()
                 self.i += 1
             except StopIteration:
-                logging.warning('End of Run.')
-                if 'end_of_run' in dir(Worker.conf):
-                    Worker.conf.end_of_run()
-                ipc.mpi.slave_done()
                 return None
         return EventTranslator(evt, self)
 
+    def _lazy(self, func):
+        """Returns func, which calls psana when the data of a
+        Record is accessed, holding the lock of the translator"""
+        def call():
+            with self.lock:
+                return func()
+        return call
+
+    def _next_index(self, total):
+        """Returns the index of the next event to be read, out of total,
+        or None if there are no events left for this rank."""
+        if self.work_chunk and self.i >= self.i_stop:
+            chunk = ipc.mpi.request_work('lcls', total, self.work_chunk, self.work_offset)
+            if chunk is None:
+                return None
+            self.i, self.i_stop = chunk
+        if self.i >= total:
+            return None
+        self.i += 1
+        return self.i - 1
+
+    @_locked
     def event_keys(self, evt):
         """Returns the translated keys available"""
-        native_keys = evt.keys()
-        common_keys = set()
-        for k in native_keys:
-            for c in self._native_to_common(k):
-                common_keys.add(c)
         # parameters corresponds to the EPICS values, analysis is for values added later on
-        return list(common_keys)+['parameters']+['analysis']
-
-    def _native_to_common(self, key):
-        """Translates a native key to a hummingbird one"""
-        if(key.type() in self._n2c):
-            return [self._n2c[key.type()]]
-        else:
-            return []
-
+        return self._event_index(evt).keys()+['parameters']+['analysis']
+
+    def _event_index(self, evt):
+        """Returns the native keys of the event grouped by hummingbird key.
+        The index of the last event is kept, as most keys of an event are
+        translated one after the other."""
+        last_evt, index = self._index
+        if last_evt is not evt:
+            index = {}
+            for k in evt.keys():
+                common_key = self._n2c.get(k.type())
+                if common_key is not None:
+                    index.setdefault(common_key, []).append(k)
+            self._index = (evt, index)
+        return index
+
+    @_locked
     def event_native_keys(self, evt):
         """Returns the native keys available"""
         return evt.keys()
 
+    @_locked
     def translate(self, evt, key):
         """Returns a dict of Records that match a given humminbird key"""
         values = {}
         if(key in self._c2n):
             return self.translate_core(evt, key)
         elif(key == 'parameters'):
-            return self._tr_epics()
+            return self._tr_epics(evt)
         elif(key == 'analysis'):
             return {}
         elif(key == 'stream'):
@@ -286,53 +378,40 @@ class LCLSTranslator(object):
         Core keys include  all except: parameters, any psana create key,
         any native key."""
         values = {}
-        native_keys = self._c2n[key]
-        event_keys = evt.keys()
-        for k in event_keys:
-            if(k.type() in native_keys):
-                obj = evt.get(k.type(), k.src(), k.key())
-                if(isinstance(obj, psana.Bld.BldDataFEEGasDetEnergy) or
-                   isinstance(obj, psana.Bld.BldDataFEEGasDetEnergyV1)):
-                    self._tr_bld_data_fee_gas_det_energy(values, obj)
-                elif(isinstance(obj, psana.Lusi.IpmFexV1)):
-                    self._tr_lusi_ipm_fex(values, obj, k)
-                elif(key == 'photonEnergies'):
-                    self._tr_bld_data_ebeam(values, obj)
-                elif(isinstance(obj, psana.CsPad2x2.ElementV1)):
-                    self._tr_cspad2x2(values, obj)
-                elif(isinstance(obj, psana.CsPad.DataV2)):
-                    self._tr_cspad(values, obj, k)
-                # AMO
-                elif(isinstance(obj, psana.PNCCD.FullFrameV1)):
-                    self._tr_pnccdFullFrame(values, obj, k)
-                elif(isinstance(obj, psana.PNCCD.FramesV1)):
-                    self._tr_pnccdFrames(values, obj, k)
-                # --
-                elif(isinstance(obj, psana.Acqiris.DataDescV1)):
-                    self._tr_acqiris(values, obj, k)
-                elif(isinstance(obj, psana.Camera.FrameV1)):
-                    self._tr_camera(values, obj)
-                elif(isinstance(obj, psana.EventId)):
-                    self._tr_event_id(values, obj)
-                elif(isinstance(obj, psana.EvrData.DataV3) or
-                     isinstance(obj, psana.EvrData.DataV4)):
-                    self._tr_event_codes(values, obj)
-                else:
-                    print type(obj)
-                    print k
-                    raise RuntimeError('%s not yet supported' % (type(obj)))
+        names = (self.state.get('keys') or {}).get(key)
+        for k in self._event_index(evt).get(key, []):
+            if names is not None and not self._is_declared(k, names):
+                continue
+            obj = evt.get(k.type(), k.src(), k.key())
+            handler = self._dispatch.get(k.type())
+            if handler is None:
+                print type(obj)
+                print k
+                raise RuntimeError('%s not yet supported' % (type(obj)))
+            handler(values, obj, k, evt)
         return values
 
+    def _is_declared(self, evt_key, names):
+        """Returns False if none of the given record names can come from evt_key"""
+        if evt_key.type() not in self._source_named:
+            return True
+        source = self._s2c.get(str(evt_key.src()))
+        return source is None or any([n.startswith(source) for n in names])
+
+    @_locked
     def event_id(self, evt):
         """Returns an id which should be unique for each
         shot and increase monotonically"""
-        return self.translate(evt, 'eventID')['Timestamp'].timestamp
+        seconds, nanoseconds = evt.get(psana.EventId).time()
+        return seconds + nanoseconds*1e-9
 
+    @_locked
     def event_id2(self, evt):
         """Returns the LCLS time, a 64-bit integer as an alterative ID"""
-        return self.translate(evt, 'eventID')['Timestamp'].timestamp2
+        seconds, nanoseconds = evt.get(psana.EventId).time()
+        return seconds << 32 | nanoseconds
 
-    def _tr_bld_data_ebeam(self, values, obj):
+    def _tr_bld_data_ebeam(self, values, obj, evt_key, evt):
         """Translates BldDataEBeam to hummingbird photon energy"""
         photon_energy_ev = -1
         if(isinstance(obj, psana.Bld.BldDataEBeamV6)):
@@ -360,7 +439,7 @@ class LCLSTranslator(object):
 
         add_record(values, 'photonEnergies', 'photonEnergy', photon_energy_ev, ureg.eV)
 
-    def _tr_bld_data_fee_gas_det_energy(self, values, obj):
+    def _tr_bld_data_fee_gas_det_energy(self, values, obj, evt_key, evt):
         """Translates gas monitor detector to hummingbird pulse energy"""
         # convert from mJ to J
         add_record(values, 'pulseEnergies', 'f_11_ENRC', obj.f_11_ENRC(), ureg.mJ)
@@ -368,19 +447,20 @@ class LCLSTranslator(object):
         add_record(values, 'pulseEnergies', 'f_21_ENRC', obj.f_21_ENRC(), ureg.mJ)
         add_record(values, 'pulseEnergies', 'f_22_ENRC', obj.f_22_ENRC(), ureg.mJ)
 
-    def _tr_lusi_ipm_fex(self, values, obj, evt_key):
+    def _tr_lusi_ipm_fex(self, values, obj, evt_key, evt):
         """Translates Ipm relative pulse energy monitor
         to hummingbird pulse energy"""
         add_record(values, 'pulseEnergies', 'IpmFex - '+str(evt_key.src()), obj.sum(), ureg.ADU)
 
-    def _tr_cspad2x2(self, values, obj):
+    def _tr_cspad2x2(self, values, obj, evt_key, evt):
         """Translates CsPad2x2 to hummingbird numpy array"""
-        try:
-            add_record(values, 'photonPixelDetectors', 'CsPad2x2S', obj.data(), ureg.ADU)
-        except AttributeError:
-            add_record(values, 'photonPixelDetectors', 'CsPad2x2', obj.data16(), ureg.ADU)
+        # Data is only copied out of psana when accessed
+        if hasattr(obj, 'data'):
+            add_record(values, 'photonPixelDetectors', 'CsPad2x2S', self._lazy(obj.data), ureg.ADU)
+        else:
+            add_record(values, 'photonPixelDetectors', 'CsPad2x2', self._lazy(obj.data16), ureg.ADU)
 
-    def _tr_camera(self, values, obj):
+    def _tr_camera(self, values, obj, evt_key, evt):
         """Translates Camera frame to hummingbird numpy array"""
         #if obj.depth == 16 or obj.depth() == 12:
         #    data = obj.data16()
@@ -388,102 +468,209 @@ class LCLSTranslator(object):
         #else:
         #    data = obj.data8()
         #    print data.shape
-        data = obj.data16()
+        # The shape of obj.data16() is (height, width)
+        shape = (obj.height(), obj.width())
 
         # off Axis cam at CXI
-        #if data.shape == (1024,1024):
-        #    add_record(values, 'camera', 'offAxis', data, ureg.ADU)
+        #if shape == (1024,1024):
+        #    add_record(values, 'camera', 'offAxis', obj.data16, ureg.ADU)
   
         # MCP (PNCCD replacement) at AMO (June 2016)
-        if data.shape == (1024,1024):
-            add_record(values, 'camera', 'mcp', data, ureg.ADU)
+        if shape == (1024,1024):
+            add_record(values, 'camera', 'mcp', self._lazy(obj.data16), ureg.ADU)
 
-        if data.shape == (1752,2336):
-            add_record(values, 'camera', 'onAxis', data, ureg.ADU)
+        if shape == (1752,2336):
+            add_record(values, 'camera', 'onAxis', self._lazy(obj.data16), ureg.ADU)
 
-    def _tr_cspad(self, values, obj, evt_key):
+    def _tr_cspad(self, values, obj, evt_key, evt):
         """Translates CsPad to hummingbird numpy array, quad by quad"""
         n_quads = obj.quads_shape()[0]
         for i in range(0, n_quads):
             add_record(values, 'photonPixelDetectors', '%sQuad%d' % (self._s2c[str(evt_key.src())], i),
-                       obj.quads(i).data(), ureg.ADU)
-    def _tr_pnccdFullFrame(self, values, obj, evt_key):
+                       self._lazy(lambda i=i: obj.quads(i).data()), ureg.ADU)
+    def _tr_pnccdFullFrame(self, values, obj, evt_key, evt):
         """Translates full pnCCD frame to hummingbird numpy array"""
-        add_record(values, 'photonPixelDetectors', '%sfullFrame' % self._s2c[str(evt_key.src())], obj.data(), ureg.ADU)
-    def _tr_pnccdFrames(self, values, obj, evt_key):
+        add_record(values, 'photonPixelDetectors', '%sfullFrame' % self._s2c[str(evt_key.src())], self._lazy(obj.data), ureg.ADU)
+    def _tr_pnccdFrames(self, values, obj, evt_key, evt):
         """Translates pnCCD frames to hummingbird numpy array, frame by frame"""
         n_frames = obj.frame_shape()[0]
         for i in range(0, n_frames):
             add_record(values, 'photonPixelDetectors', '%sFrame%d' % (self._s2c[str(evt_key.src())], i),
-                       obj.frame(i).data(), ureg.ADU)
-    def _tr_acqiris(self, values, obj, evt_key):
+                       self._lazy(lambda i=i: obj.frame(i).data()), ureg.ADU)
+    def _tr_acqiris(self, values, obj, evt_key, evt):
         """Translates Acqiris TOF data to hummingbird numpy array"""
-        config_store = self.data_source.env().configStore()
-        acq_config = config_store.get(psana.Acqiris.ConfigV1, evt_key.src())
-        samp_interval = acq_config.horiz().sampInterval()
+        src = str(evt_key.src())
+        slopes, offsets, samp_interval, samp_times = self._acqiris_calibration(evt_key)
         n_channels = obj.data_shape()[0]
+        elems = [obj.data(i) for i in range(0, n_channels)]
+        waveforms = [elem.waveforms()[0] for elem in elems]
+        shape = waveforms[0].shape
+        if(len(slopes) != n_channels or
+           any(w.shape != shape for w in waveforms) or
+           any(not 0 < elem.nbrSamplesInSeg() <= len(samp_times) for elem in elems)):
+            # Missing or unusual channels are translated one by one
+            self._tr_acqiris_channels(values, elems, waveforms, evt_key,
+                                      slopes, offsets, samp_interval)
+            return
+        # All channels share the horizontal configuration, so the
+        # waveforms are scaled together as one block
+        data = self._buffers.get(src, (n_channels,) + shape, numpy.float64)
+        for i in range(0, n_channels):
+            data[i] = waveforms[i]
+        data *= slopes
+        data -= offsets
         for i in range(0, n_channels):
-            vert = acq_config.vert()[i]
-            elem = obj.data(i)
-            timestamp = elem.timestamp()[0].value()
-            raw = elem.waveforms()[0]
+            elem = elems[i]
+            nbr_samples = elem.nbrSamplesInSeg()
+            rec = Record('%s Channel %d' %(self._s2c[src], i),
+                         data[i], ureg.V)
+            rec.time = self._buffers.get((src, 'time', i), (nbr_samples,), numpy.float64)
+            numpy.add(samp_times[:nbr_samples], elem.timestamp()[0].value(), out=rec.time)
+            values[rec.name] = rec
+
+    def _tr_acqiris_channels(self, values, elems, waveforms, evt_key,
+                             slopes, offsets, samp_interval):
+        """Translates the Acqiris channels one at a time, without buffers"""
+        for i in range(0, len(elems)):
+            elem = elems[i]
             if(elem.nbrSamplesInSeg() == 0):
                 logging.warning("Warning: TOF data for "
                                 "detector %s is missing.", evt_key)
-            data = raw*vert.slope() - vert.offset()
+            data = waveforms[i]*slopes[i, 0] - offsets[i, 0]
             rec = Record('%s Channel %d' %(self._s2c[str(evt_key.src())], i),
                          data, ureg.V)
-            rec.time = (timestamp +
+            rec.time = (elem.timestamp()[0].value() +
                         samp_interval * numpy.arange(0, elem.nbrSamplesInSeg()))
             values[rec.name] = rec
 
-    def _tr_event_id(self, values, obj):
+    def _acqiris_calibration(self, evt_key):
+        """Returns the slope and offset of every channel, as columns, the
+        sampling interval and the times of the samples relative to the first
+        one of the Acqiris of evt_key. They are computed again only when its
+        configuration changes, i.e. after a configure or calib cycle transition."""
+        src = str(evt_key.src())
+        config_store = self.data_source.env().configStore()
+        acq_config = config_store.get(psana.Acqiris.ConfigV1, evt_key.src())
+        vert = acq_config.vert()
+        horiz = acq_config.horiz()
+        config = (tuple([(v.slope(), v.offset()) for v in vert]),
+                  horiz.sampInterval(), horiz.nbrSamples())
+        if src not in self._acqiris or self._acqiris[src][0] != config:
+            slopes = numpy.array([[slope] for slope, _ in config[0]])
+            offsets = numpy.array([[offset] for _, offset in config[0]])
+            samp_times = horiz.sampInterval() * numpy.arange(0, horiz.nbrSamples())
+            self._acqiris[src] = (config, (slopes, offsets, horiz.sampInterval(), samp_times))
+        return self._acqiris[src][1]
+
+    def _run_number(self, evt):
+        """Returns the run number of the event"""
+        return evt.get(psana.EventId).run()
+
+    def _tr_event_id(self, values, obj, evt_key, evt):
         """Translates LCLS eventID into a hummingbird one"""
-        timestamp = obj.time()[0]+obj.time()[1]*1e-9
-        time = datetime.datetime.fromtimestamp(timestamp, tz=timezone('utc'))
-        time = time.astimezone(tz=timezone('US/Pacific'))
-        rec = Record('Timestamp', time, ureg.s)
-        time = datetime.datetime.fromtimestamp(obj.time()[0])
-        rec.datetime64 = numpy.datetime64(time, 'ns')+obj.time()[1]
+        seconds, nanoseconds = obj.time()
+        rec = TimestampRecord('Timestamp', seconds, nanoseconds, ureg.s)
         rec.fiducials = obj.fiducials()
         rec.run = obj.run()
         rec.ticks = obj.ticks()
         rec.vector = obj.vector()
-        rec.timestamp = timestamp
-        rec.timestamp2 = obj.time()[0] << 32 | obj.time()[1]
         values[rec.name] = rec
 
-    def _tr_event_codes(self, values, obj):
+    def _tr_event_codes(self, values, obj, evt_key, evt):
         """Translates LCLS event codes into a hummingbird ones"""
         codes = []
         for fifo_event in obj.fifoEvents():
             codes.append(fifo_event.eventCode())
         add_record(values, 'eventCodes', 'EvrEventCodes', codes)
 
-    def _tr_epics(self):
+    def _tr_epics(self, evt):
         """Returns an EPICSdict that provides access to EPICS parameters.
 
-        Check the EPICSdict class for more details.
+        The PVs declared in ``state['LCLS']['EpicsPVs']`` or
+        ``state['keys']['parameters']`` are fetched together, once per
+        event, the others only when accessed. Check the EPICSdict class
+        for more details.
         """
-        return EPICSdict(self.data_source.env().epicsStore())
+        run = self._run_number(evt)
+        if self._epics is None or self._epics.run != run:
+            self._epics = EPICScache(self.data_source.env().epicsStore(), run, self.lock)
+        declared = (self.state.get('keys') or {}).get('parameters') or []
+        snapshot = self._epics.snapshot(set(self._epics_pvs) | set(declared))
+        return EPICSdict(self._epics, snapshot)
+
+class EPICScache(object):
+    """Keeps the EPICS names and translated parameters of a run.
+
+    EPICS values change much less often than events arrive, so a
+    parameter is only translated again when its time stamp changes.
+    The EPICS store is only accessed holding the given lock.
+    """
+    def __init__(self, epics, run, lock):
+        self.epics = epics
+        self.run = run
+        self.lock = lock
+        self._keys = None
+        self._records = {}
+        self._invalid = set()
+
+    def keys(self):
+        """Returns available EPICS names"""
+        with self.lock:
+            if self._keys is None:
+                self._keys = self.epics.pvNames() + self.epics.aliases()
+            return self._keys
+
+    def record(self, key):
+        """Returns the current value of the EPICS parameter as a Record"""
+        with self.lock:
+            return self._record(key)
+
+    def snapshot(self, keys):
+        """Returns a dict with the current values of the given EPICS
+        parameters as Records, fetched together holding the lock once.
+        Invalid names are left out, with a warning the first time."""
+        records = {}
+        with self.lock:
+            for key in keys:
+                if key in self._invalid:
+                    continue
+                try:
+                    records[key] = self._record(key)
+                except KeyError:
+                    self._invalid.add(key)
+                    logging.warning("%s is not a valid EPICS key", key)
+        return records
+
+    def _record(self, key):
+        pv = self.epics.getPV(key)
+        if(pv is None):
+            raise KeyError('%s is not a valid EPICS key' %(key))
+        # Control PVs have no time stamp, compare their values instead
+        if hasattr(pv, 'stamp'):
+            stamp = (pv.stamp().sec(), pv.stamp().nsec())
+        else:
+            stamp = pv.value(0)
+        if key not in self._records or self._records[key][0] != stamp:
+            rec = Record(key, pv.value(0))
+            rec.pv = pv
+            self._records[key] = (stamp, rec)
+        return self._records[key][1]
 
 class EPICSdict(object):
     """Provides a dict-like interface to EPICS parameters.
 
     Translated  all the parameters is too slow too slow.
     Instead parameters are only translated as they are needed,
-    when they are accessed, using this class.
+    when they are accessed, using this class. The parameters of
+    the given snapshot, if any, are served from it.
     """
-    def __init__(self, epics):
-        self.epics = epics
-        self._cache = {}
-        self._keys = None
+    def __init__(self, epics_cache, snapshot=None):
+        self.epics_cache = epics_cache
+        self._cache = dict(snapshot or {})
 
     def keys(self):
         """Returns available EPICS names"""
-        if self._keys is None:
-            self._keys = self.epics.pvNames() + self.epics.aliases()
-        return self._keys
+        return self.epics_cache.keys()
 
     def len(self):
         """Returns the length of the dictionary"""
@@ -492,10 +679,5 @@ class EPICSdict(object):
     def __getitem__(self, key):
         """Calls psana to retrieve and translate the EPICS item"""
         if(key not in self._cache):
-            pv = self.epics.getPV(key)
-            if(pv is None):
-                raise KeyError('%s is not a valid EPICS key' %(key))
-            rec = Record(key, pv.value(0))
-            rec.pv = pv
-            self._cache[key] = rec
+            self._cache[key] = self.epics_cache.record(key)
         return self._cache[key]
@@ -0,0 +1,60 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Reads events ahead of the analysis on a background thread."""
+import sys
+import threading
+import Queue
+
+class EventPrefetcher(object):
+    """Reads events ahead of the analysis on a background thread.
+
+    Wraps a translator and keeps calling its ``next_event()`` on a
+    separate thread, storing up to ``depth`` events in a bounded queue.
+    Exceptions raised by the translator are re-raised on the consumer
+    side in the order they happened and the end of the run (``None``)
+    is passed on like any other event.
+
+    The keys declared in ``state['keys']``, and their data, are translated
+    on the background thread as well. Other keys are translated when the
+    analysis accesses them, while the thread reads the next events, so the
+    translator must allow this (the LCLS one serializes its psana calls).
+    Facility state which is not part of the event itself (e.g. the EPICS
+    or configuration stores) reflects the position of the reader, which
+    can be up to ``depth`` events ahead of the analysis, unless it is
+    translated there.
+
+    Args:
+        translator: The translator used to read the events
+        depth (int): The maximum number of events read ahead
+    """
+    def __init__(self, translator, depth):
+        self.translator = translator
+        self.library = translator.library
+        self._queue = Queue.Queue(depth)
+        self._thread = threading.Thread(target=self._read_loop)
+        # Make sure the program exits even when the reader is blocked
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read_loop(self):
+        """Reads events until the end of the run. Runs on a separate thread."""
+        while True:
+            try:
+                evt = self.translator.next_event()
+                if evt is not None:
+                    evt.warm()
+            except Exception: # pylint: disable=broad-except
+                self._queue.put((None, sys.exc_info()))
+                continue
+            self._queue.put((evt, None))
+            if evt is None:
+                return
+
+    def next_event(self):
+        """Returns the oldest event read ahead, waiting for it if needed"""
+        evt, exc_info = self._queue.get()
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return evt
@@ -3,6 +3,9 @@
 # Hummingbird is distributed under the terms of the Simplified BSD License.
 # -------------------------------------------------------------------------
 """Generic storage class for a name/data pair extracted from an event"""
+import datetime
+import numpy
+from pytz import timezone
 
 def add_record(values, group, name, data, unit=None):
     """Convenience function to add a new Record
@@ -38,3 +41,38 @@ class Record(object):
     @data.setter
     def data(self, value):
         self._data = value
+
+class TimestampRecord(Record):
+    """
+    Record of the time of an event, given in seconds and nanoseconds
+    since the epoch.
+
+    The numeric timestamps are cheap to get. The data, the time as a
+    datetime in Pacific time, and datetime64 are only computed when accessed.
+    """
+    def __init__(self, name, seconds, nanoseconds, unit=None):
+        Record.__init__(self, name, self._to_datetime, unit)
+        self.seconds = seconds
+        self.nanoseconds = nanoseconds
+
+    @property
+    def timestamp(self):
+        """The time in seconds since the epoch, as a float"""
+        return self.seconds + self.nanoseconds*1e-9
+
+    @property
+    def timestamp2(self):
+        """The time as a 64-bit integer, seconds in the upper and nanoseconds
+        in the lower 32 bits, like the LCLS time"""
+        return self.seconds << 32 | self.nanoseconds
+
+    @property
+    def datetime64(self):
+        """The time as a numpy.datetime64"""
+        time = datetime.datetime.fromtimestamp(self.seconds)
+        return numpy.datetime64(time, 'ns')+self.nanoseconds
+
+    def _to_datetime(self):
+        """Returns the time as a datetime in Pacific time"""
+        time = datetime.datetime.fromtimestamp(self.timestamp, tz=timezone('utc'))
+        return time.astimezone(tz=timezone('US/Pacific'))
@@ -0,0 +1,209 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Replays events recorded to HDF5 files, e.g. by analysis.recorder.Recorder"""
+import bisect
+import glob
+import h5py
+import numpy
+from backend.event_translator import EventTranslator
+from backend.record import TimestampRecord, add_record
+from . import ureg
+import ipc
+
+class ChunkedReader(object):
+    """Reads the frames of a dataset whose first axis is the event axis.
+
+    Datasets which are stored contiguously and uncompressed are memory
+    mapped, such that frames are returned without copying. Changing the
+    frames only changes them in memory, not in the file. Otherwise
+    frames are read a block of whole HDF5 chunks at a time.
+
+    Args:
+        filename (str): The HDF5 file
+        dataset (h5py.Dataset): The dataset to read from
+        block_size (int): The minimum number of frames read at once
+    """
+    def __init__(self, filename, dataset, block_size):
+        self._dataset = dataset
+        self._memmap = None
+        # Start, stop and data of the last block read
+        self._block = (0, 0, None)
+        offset = dataset.id.get_offset()
+        if offset is not None and dataset.size > 0:
+            # Copy on write, such that the analysis can change the frames
+            self._memmap = numpy.memmap(filename, dtype=dataset.dtype, mode='c',
+                                        offset=offset, shape=dataset.shape)
+        else:
+            chunk = dataset.chunks[0] if dataset.chunks else 1
+            self._block_size = max(1, block_size // chunk) * chunk
+
+    def __len__(self):
+        return self._dataset.shape[0]
+
+    def __getitem__(self, i):
+        if self._memmap is not None:
+            return self._memmap[i]
+        start, stop, data = self._block
+        if not start <= i < stop:
+            # Blocks start at multiples of the block size, which is a
+            # multiple of the chunk size, so only whole chunks are read
+            start = (i // self._block_size) * self._block_size
+            stop = min(start + self._block_size, len(self))
+            data = self._dataset[start:stop]
+            self._block = (start, stop, data)
+        return data[i - start]
+
+class ReplayTranslator(object):
+    """Replays events recorded to HDF5 files, e.g. the ``hits_<run>_<rank>.h5``
+    files written by analysis.recorder.Recorder or CXI files.
+
+    The files are given in ``state['Replay']['Files']``, as a list or a glob
+    pattern, and ``state['Replay']['Data Sources']`` defines how their datasets
+    are translated, in the same way as for the dummy translator::
+
+        state['Replay'] = {
+            'Files': '/scratch/hits/hits_*.h5',
+            'Data Sources': {
+                'CsPad Ds2': {
+                    'dataset': 'entry_1/detector_1/data',
+                    'unit': 'ADU',
+                    'type': 'photonPixelDetectors'
+                }
+            }
+        }
+
+    The events of all files are split in contiguous blocks among the ranks and
+    replayed as fast as the analysis goes.
+    """
+    # The entry of the state with the options of the translator
+    state_key = 'Replay'
+    # The data sources used if none are given
+    default_sources = None
+    def __init__(self, state):
+        self.library = 'h5py'
+        self.state = state
+        conf = state[self.state_key]
+        filenames = conf['Files']
+        if isinstance(filenames, basestring):
+            filenames = sorted(glob.glob(filenames))
+        if not filenames:
+            raise ValueError("No files found for [%s][Files]" % self.state_key)
+        self._sources = conf.get('Data Sources', self.default_sources)
+        if self._sources is None:
+            raise ValueError("You need to set the '[%s][Data Sources]'"
+                             " in the configuration" % self.state_key)
+        self._units = {}
+        for name, source in self._sources.items():
+            unit = source.get('unit', None)
+            if isinstance(unit, basestring):
+                unit = ureg.parse_expression(unit)
+            self._units[name] = unit
+        # Datasets of the event identifiers, as written by the Recorder
+        self._id_datasets = conf.get('Event ID', {'timestamp': 'LCLS/timestamp',
+                                                  'fiducials': 'LCLS/fiducial',
+                                                  'run': 'LCLS/run'})
+        block_size = conf.get('Block Size', 32)
+
+        # The readers of the data sources and, separately such that they
+        # can not clash with the names of the sources, of the identifiers
+        self._files = []
+        self._readers = []
+        self._id_readers = []
+        self._first = []
+        nr_events = 0
+        for filename in filenames:
+            h5file = h5py.File(filename, 'r')
+            readers = {}
+            for name, source in self._sources.items():
+                readers[name] = ChunkedReader(filename, h5file[source['dataset']], block_size)
+            id_readers = {}
+            for name, path in self._id_datasets.items():
+                if path in h5file:
+                    id_readers[name] = ChunkedReader(filename, h5file[path], block_size)
+            self._files.append(h5file)
+            self._readers.append(readers)
+            self._id_readers.append(id_readers)
+            self._first.append(nr_events)
+            nr_events += min([len(r) for r in readers.values() + id_readers.values()])
+
+        # Every rank replays a contiguous block of events
+        rank = ipc.mpi.slave_rank()
+        nr_workers = ipc.mpi.nr_workers()
+        self.i = nr_events * rank // nr_workers
+        self._stop = nr_events * (rank + 1) // nr_workers
+
+    def next_event(self):
+        """Returns the next recorded event of this rank"""
+        if self.i >= self._stop:
+            return None
+        k = bisect.bisect_right(self._first, self.i) - 1
+        evt = {'file': k, 'index': self.i - self._first[k], 'event': self.i}
+        self.i += 1
+        return EventTranslator(evt, self)
+
+    def close(self):
+        """Closes the files, called at the end of the run"""
+        for h5file in self._files:
+            h5file.close()
+        self._files = []
+
+    def event_keys(self, evt):
+        """Returns the translated keys available"""
+        keys = list(set([source['type'] for source in self._sources.values()]))
+        if 'timestamp' in self._id_readers[evt['file']]:
+            keys.append('eventID')
+        return keys + ['analysis']
+
+    def event_native_keys(self, _):
+        """Returns the native keys available"""
+        return [source['dataset'] for source in self._sources.values()]
+
+    def translate(self, evt, key):
+        """Returns a dict of Records that match a given Humminbird key"""
+        values = {}
+        readers = self._readers[evt['file']]
+        if key == 'eventID':
+            self._tr_event_id(values, evt)
+        elif key == 'analysis':
+            return values
+        for name, source in self._sources.items():
+            if source['type'] == key:
+                reader = readers[name]
+                # Frames are only read when accessed
+                add_record(values, key, name, lambda r=reader, i=evt['index']: r[i],
+                           self._units[name])
+        if values == {}:
+            raise RuntimeError('%s not found in event' % (key))
+        return values
+
+    def _tr_event_id(self, values, evt):
+        """Translates the recorded LCLS timestamp, if any, into a hummingbird one"""
+        readers = self._id_readers[evt['file']]
+        if 'timestamp' not in readers:
+            return
+        timestamp2 = int(readers['timestamp'][evt['index']])
+        rec = TimestampRecord('Timestamp', timestamp2 >> 32, timestamp2 & 0xFFFFFFFF, ureg.s)
+        if 'fiducials' in readers:
+            rec.fiducials = int(readers['fiducials'][evt['index']])
+        if 'run' in readers:
+            rec.run = int(readers['run'][evt['index']])
+        values[rec.name] = rec
+
+    def event_id(self, evt):
+        """Returns the recorded timestamp, or the number of the event
+        if no timestamps were recorded"""
+        readers = self._id_readers[evt['file']]
+        if 'timestamp' not in readers:
+            return float(evt['event'])
+        timestamp2 = int(readers['timestamp'][evt['index']])
+        return (timestamp2 >> 32) + (timestamp2 & 0xFFFFFFFF)*1e-9
+
+    def event_id2(self, evt):
+        """Returns the recorded LCLS time, a 64-bit integer, or the
+        number of the event if no timestamps were recorded"""
+        readers = self._id_readers[evt['file']]
+        if 'timestamp' not in readers:
+            return evt['event']
+        return int(readers['timestamp'][evt['index']])
@@ -0,0 +1,169 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Skips low priority analysis stages when a worker falls behind.
+
+Stages are functions of the configuration file declared with a priority,
+0 being essential and larger numbers being less important, e.g.::
+
+    import backend.scheduler
+
+    @backend.scheduler.stage(priority=2, budget=0.05)
+    def sizing(evt):
+        ...
+
+    def onEvent(evt):
+        ...
+        sizing(evt)
+
+Stages with a priority larger than 0 are skipped when
+
+- the master cannot keep up with sending out the data of all the workers
+  (unless the workers publish their data directly, see ``state['zmq_direct']``),
+- running them would exceed ``state['event_budget']``, the time in seconds
+  a worker can spend on an event, given the time already spent on it and
+  the budget (or the measured mean time) of the stage,
+- the worker has been taking longer than ``state['event_budget']`` per event
+  for a while. The least important stages are shed first, one priority
+  level at a time, and they are run again once the worker caught up.
+  The level changes at most every ``COOLDOWN`` events, such that the
+  mean time per event can follow.
+"""
+import time
+import threading
+import logging
+import ipc
+
+stages = {}
+_local = threading.local()
+# Guards the state shared by the threads analysing events, see state['event_threads']
+_lock = threading.Lock()
+# Mean time per event, and stages with a priority at or above _shed_priority are skipped
+_mean_event_time = 0.
+_shed_priority = None
+# Number of events analysed, and when _shed_priority last changed
+_nr_events = 0
+_last_change = 0
+# Events between changes of _shed_priority, about twice the time
+# the mean time per event takes to follow a change
+COOLDOWN = 20
+
+class Stage(object):
+    """Runs an analysis function as a stage with a given priority and budget"""
+    def __init__(self, func, name, priority, budget):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.budget = budget
+        self.mean_time = 0.
+        self.count = 0
+        self.skipped = 0
+
+    def __call__(self, *args, **kwargs):
+        if not self.should_run():
+            with _lock:
+                self.skipped += 1
+            ipc.stats.skip('stage(%s)' % self.name)
+            return None
+        t0 = time.time()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            dt = time.time() - t0
+            with _lock:
+                self.count += 1
+                self.mean_time += (dt - self.mean_time) / min(self.count, 100)
+            ipc.stats.add('stage(%s)' % self.name, dt)
+
+    def should_run(self):
+        """Returns True if there is time left to run this stage"""
+        if self.priority <= 0:
+            return True
+        # With state['zmq_direct'] the data does not go through the master
+        if ipc.mpi.congested and ipc.publisher is None:
+            return False
+        if _shed_priority is not None and self.priority >= _shed_priority:
+            return False
+        budget = getattr(_local, 'budget', None)
+        if budget is None:
+            return True
+        elapsed = time.time() - _local.start
+        expected = self.budget if self.budget is not None else self.mean_time
+        return elapsed + expected <= budget
+
+def stage(name=None, priority=0, budget=None):
+    """Decorator declaring an analysis function as a stage.
+
+    Kwargs:
+        :name(str):       Name of the stage, default is the function name
+        :priority(int):   0 for essential stages, larger numbers for less important ones
+        :budget(float):   Time in seconds the stage is expected to take at most,
+                          default is its measured mean time
+    """
+    def declare(func):
+        stage_name = name if name is not None else func.__name__
+        stages[stage_name] = Stage(func, stage_name, priority, budget)
+        return stages[stage_name]
+    return declare
+
+def start_event(budget):
+    """Called by the worker when the analysis of an event starts. The event
+    may take budget seconds, or as long as needed if budget is None."""
+    _local.start = time.time()
+    _local.budget = budget
+
+def end_event():
+    """Called by the worker when the analysis of an event ends"""
+    global _mean_event_time, _shed_priority, _nr_events, _last_change # pylint: disable=global-statement
+    budget = getattr(_local, 'budget', None)
+    # Stages run after the event, e.g. in end_of_run(), have no budget
+    _local.budget = None
+    if budget is None or not stages:
+        return
+    dt = time.time() - _local.start
+    lowest = max([s.priority for s in stages.values()])
+    if lowest <= 0:
+        # Only essential stages, nothing to skip
+        return
+    with _lock:
+        _mean_event_time += 0.1*(dt - _mean_event_time)
+        _nr_events += 1
+        if _nr_events - _last_change < COOLDOWN:
+            return
+        if _mean_event_time > budget:
+            # Falling behind, shed one more priority level
+            if _shed_priority is None:
+                _shed_priority = lowest
+            elif _shed_priority > 1:
+                _shed_priority -= 1
+            else:
+                return
+            _last_change = _nr_events
+            logging.info("Falling behind, skipping stages with priority >= %d", _shed_priority)
+        elif _shed_priority is not None and _mean_event_time < 0.8*budget:
+            # Caught up, bring back one priority level
+            _shed_priority += 1
+            if _shed_priority > lowest:
+                _shed_priority = None
+            _last_change = _nr_events
+            logging.info("Caught up, skipping stages with priority >= %s", _shed_priority)
+
+def reset():
+    """Forgets the stages and the time per event, called by the
+    worker before the configuration is (re)loaded"""
+    global _mean_event_time, _shed_priority, _nr_events, _last_change # pylint: disable=global-statement
+    with _lock:
+        stages.clear()
+        _mean_event_time = 0.
+        _shed_priority = None
+        _nr_events = 0
+        _last_change = 0
+
+def report():
+    """Prints how often every stage was run and skipped"""
+    for name in sorted(stages):
+        s = stages[name]
+        if s.count or s.skipped:
+            print "Stage %s (priority %d): run %d times, skipped %d times" % (name, s.priority,
+                                                                              s.count, s.skipped)
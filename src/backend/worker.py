@@ -9,6 +9,11 @@ import imp
 import ipc
 import time
 import signal
+import collections
+from multiprocessing.pool import ThreadPool
+from backend.prefetch import EventPrefetcher
+from backend.event_batch import EventBatch
+from backend import scheduler
 
 class Worker(object):
     """Coordinates data reading, translation and analysis.
@@ -63,6 +68,10 @@ class Worker(object):
             except KeyError:
                 with open('.pid', 'w') as file: file.write(str(os.getpid()))
         self.reloadnow = False
+        self._batch = []
+        self._pending = collections.deque()
+        self.pool = None
+        self.nr_events = 0
         print 'Starting backend...'
 
     def raise_interruption(self, signum, stack):
@@ -70,6 +79,8 @@ class Worker(object):
         
     def load_conf(self):
         """Load or reload the configuration file."""
+        # The configuration declares its stages again
+        scheduler.reset()
         Worker.conf = imp.load_source('backend_conf', self._config_file)
         if(Worker.state is None):
             Worker.state = Worker.conf.state
@@ -81,6 +92,10 @@ class Worker(object):
     def start(self):
         """Start the event loop."""
         Worker.state['running'] = True
+        ipc.init_publisher(Worker.state)
+        if(not ipc.mpi.is_master()):
+            self.reader = init_reader(self.translator, Worker.state)
+            self.pool = init_pool(Worker.state)
         self.event_loop()
 
     def ctrlcevent(self, whatSignal, stack):
@@ -98,30 +113,28 @@ class Worker(object):
                 while(Worker.state['running']) and not self.reloadnow:
                     self.reloadnow = self.reloadnow or ipc.mpi.checkreload()
                     if(ipc.mpi.is_master()):
-                        is_exiting = ipc.mpi.master_loop()
+                        is_exiting = ipc.mpi.master_loop(Worker.state.get('reduction_file'))
                         if is_exiting:
                             return
+                        ipc.stats.publish(Worker.state.get('stats_interval', 5.))
                     else:
                         try:
-                            evt = self.translator.next_event()
+                            evt = self.next_event()
                             if evt is None:
+                                logging.warning('End of Run.')
+                                self.process_pending()
+                                self.process_batch()
+                                self.end_of_run()
                                 return
                         except (RuntimeError) as e:
                             logging.warning("Some problem with %s (library used for translation), probably due to reloading the backend. (%s)" % (self.translator.library,e))
                             raise KeyboardInterrupt
-                        ipc.set_current_event(evt)
-                        try:
-                            Worker.conf.onEvent(evt)
-                        except (KeyError, TypeError) as exc:
-                            logging.warning("Missing or wrong type of data, probably due to missing event data.", exc_info=True)
-                        except (RuntimeError) as e:
-                            logging.warning("Some problem with %s (library used for translation), probably due to reloading the backend." %self.translator.library, exc_info=True)
-                        except StopIteration:
-                            logging.warning("Stopping iteration.")
-                            if 'end_of_run' in dir(Worker.conf):
-                                Worker.conf.end_of_run()
-                            ipc.mpi.slave_done()
+                        self.nr_events += 1
+                        if not self.process_event(evt):
+                            self.end_of_run()
                             return
+                        ipc.mpi.tick(Worker.state.get('reduce_interval', 1.))
+                        ipc.stats.publish(Worker.state.get('stats_interval', 5.))
             except KeyboardInterrupt:
                 try:
                     print "Hit Ctrl+c again in the next second to quit..."
@@ -133,6 +146,10 @@ class Worker(object):
                     break
             if self.reloadnow:
                 self.reloadnow = False
+                # Events still being analysed belong to the old configuration
+                if not self.process_pending():
+                    self.end_of_run()
+                    return
                 print "Reloading configuration file."
                 self.load_conf()
         try:
@@ -141,6 +158,141 @@ class Worker(object):
             pass
         signal.signal(signal.SIGINT, self.oldHandler)
 
+    def next_event(self):
+        """Returns the next event, or None at the end of the run or once
+        ``state['max_events']`` events have been read by this rank."""
+        if self.nr_events == Worker.state.get('max_events'):
+            return None
+        t0 = time.time()
+        evt = self.reader.next_event()
+        ipc.stats.add('next_event', time.time() - t0)
+        if evt is not None and Worker.state.get('keys'):
+            # Translate the declared keys in one go, unless the prefetcher did
+            t0 = time.time()
+            evt.warm()
+            ipc.stats.add('warm', time.time() - t0)
+        return evt
+
+    def process_event(self, evt):
+        """Runs the analysis on the given event.
+
+        If the configuration defines onBatch() the event is instead added
+        to the current batch, which is analysed once it holds
+        ``state['batch_size']`` events. Returns False if the analysis
+        asked to stop the run."""
+        if 'onBatch' in dir(Worker.conf):
+            self._batch.append(evt)
+            if len(self._batch) < Worker.state.get('batch_size', 10):
+                return True
+            return self.process_batch()
+        # Events left over from a configuration which used batches
+        if not self.process_batch():
+            return False
+        if self.pool is not None:
+            return self.submit(evt)
+        return self.analyse(Worker.conf.onEvent, evt)
+
+    def submit(self, evt):
+        """Runs the analysis of the event on the thread pool.
+
+        Up to ``state['event_threads']`` events are analysed at the same time.
+        The broadcasts of every event are collected and only sent, from this
+        thread, once the event and all the events before it are done, such
+        that they arrive in order. Returns False if the analysis asked to
+        stop the run."""
+        result = self.pool.apply_async(self.analyse_collecting, (Worker.conf.onEvent, evt))
+        self._pending.append((evt, result))
+        if len(self._pending) >= Worker.state.get('event_threads', 1):
+            oldest, result = self._pending.popleft()
+            go_on, outbox = result.get()
+            ipc.broadcast.replay(oldest, outbox)
+            if not go_on:
+                self.process_pending()
+                return False
+        return True
+
+    def process_pending(self):
+        """Waits for all the events on the thread pool and sends their broadcasts.
+        Returns False if the analysis of any of them asked to stop the run."""
+        go_on = True
+        while self._pending:
+            evt, result = self._pending.popleft()
+            done, outbox = result.get()
+            ipc.broadcast.replay(evt, outbox)
+            go_on = go_on and done
+        return go_on
+
+    def analyse_collecting(self, func, evt):
+        """Same as analyse(), but collects the broadcasts instead of sending them.
+        Returns a tuple with the result of analyse() and the collected broadcasts."""
+        outbox = []
+        ipc.broadcast.collect(outbox)
+        try:
+            go_on = self.analyse(func, evt)
+        finally:
+            ipc.broadcast.collect(None)
+        return go_on, outbox
+
+    def process_batch(self):
+        """Runs the analysis on the events collected so far, if any.
+        Returns False if the analysis asked to stop the run."""
+        if not self._batch:
+            return True
+        batch = EventBatch(self._batch)
+        self._batch = []
+        if 'onBatch' in dir(Worker.conf):
+            return self.analyse(Worker.conf.onBatch, batch)
+        for evt in batch:
+            if not self.analyse(Worker.conf.onEvent, evt):
+                return False
+        return True
+
+    def analyse(self, func, evt):
+        """Calls func, onEvent() or onBatch(), with the given event or batch
+        and deals with errors due to missing event data. Returns False if
+        the analysis asked to stop the run."""
+        # Events analysed on the thread pool only become the current
+        # event once their broadcasts are sent, see ipc.broadcast.replay()
+        if not ipc.broadcast.collecting():
+            ipc.set_current_event(evt)
+        budget = Worker.state.get('event_budget')
+        if budget is not None and isinstance(evt, EventBatch):
+            budget *= len(evt)
+        scheduler.start_event(budget)
+        t0 = time.time()
+        try:
+            func(evt)
+        except (KeyError, TypeError) as exc:
+            logging.warning("Missing or wrong type of data, probably due to missing event data.", exc_info=True)
+        except (RuntimeError) as e:
+            logging.warning("Some problem with %s (library used for translation), probably due to reloading the backend." %self.translator.library, exc_info=True)
+        except StopIteration:
+            logging.warning("Stopping iteration.")
+            return False
+        except ValueError as e:
+            if 'read-only' not in str(e):
+                raise
+            logging.warning("The analysis tried to change read-only event data (%s). "
+                            "In benchmarks the frames of the dummy 'Bank Size' are shared "
+                            "between events, copy them before changing them.", e, exc_info=True)
+        finally:
+            ipc.stats.add(func.__name__, time.time() - t0)
+            scheduler.end_event()
+            # Send the scalars of the event as one message
+            ipc.broadcast.flush()
+        return True
+
+    def end_of_run(self):
+        """Call the end_of_run() of the configuration, if any, and
+        report to the master that this worker is done."""
+        if 'end_of_run' in dir(Worker.conf):
+            Worker.conf.end_of_run()
+            ipc.broadcast.flush()
+        if hasattr(self.translator, 'close'):
+            self.translator.close()
+        scheduler.report()
+        ipc.mpi.slave_done(Worker.state.get('reduction_file'))
+
 
 def init_translator(state):
     """Initialize the translator, depending on the state['Facility']."""
@@ -152,9 +304,43 @@ def init_translator(state):
     elif(state['Facility'].lower() == 'dummy'):
         from backend.dummy import DummyTranslator
         return DummyTranslator(state)
+    elif(state['Facility'].lower() == 'replay'):
+        from backend.replay import ReplayTranslator
+        return ReplayTranslator(state)
+    elif(state['Facility'].lower() == 'cxi'):
+        from backend.cxi import CXITranslator
+        return CXITranslator(state)
     else:
         raise ValueError('Facility %s not supported' % (state['Facility']))
 
+def init_reader(translator, state):
+    """Returns the object the events are read from. If state['prefetch_depth'],
+    or the look-ahead the translator asks for, is larger than 0 events are
+    read ahead on a background thread."""
+    depth = max(state.get('prefetch_depth', 0), getattr(translator, 'lookahead', 0))
+    if depth > 0 and state.get('work_queue') and not ipc.mpi.thread_multiple():
+        # The background thread would request work from the master
+        logging.warning("Not reading ahead, the MPI library does not support "
+                        "calls from several threads, which work_queue needs")
+        depth = 0
+    if depth > 0:
+        return EventPrefetcher(translator, depth)
+    return translator
+
+def init_pool(state):
+    """Returns a thread pool for the analysis if state['event_threads']
+    is larger than 1, otherwise None."""
+    nr_threads = state.get('event_threads', 1)
+    if nr_threads > 1 and not ipc.mpi.thread_multiple():
+        # The analysis can make MPI calls, e.g. ipc.mpi.sum()
+        logging.warning("Analysing one event at a time, the MPI library does "
+                        "not support calls from several threads, which "
+                        "event_threads needs")
+        nr_threads = 1
+    if nr_threads > 1:
+        return ThreadPool(nr_threads)
+    return None
+
 def check_pid(pid):        
     """ Check For the existence of a unix pid. """
     try:
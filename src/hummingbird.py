@@ -24,6 +24,12 @@ def parse_cmdline_args():
                        "given configuration file", nargs='?', const=True)
     group.add_argument('-r', '--reload', help='reloads the backend',
                        action='store_true')
+    group.add_argument('--benchmark', metavar='conf.py', type=str,
+                       help="run the backend with given configuration file on "
+                       "a fixed number of events as fast as possible and "
+                       "report the performance as JSON")
+    parser.add_argument("-n", "--events", type=int, default=1000,
+                        help="number of events per rank to benchmark, defaults to 1000")
     parser.add_argument("-p", "--port",
                         type=int, default=13131, help="overwrites the port, defaults to 13131")
     parser.add_argument("-v", "--verbose", help="increase output verbosity",
@@ -74,6 +80,9 @@ def main():
             from pycallgraph.output import GraphvizOutput
             with PyCallGraph(output=GraphvizOutput()):
                 worker.start()
+    elif(args.benchmark is not None):
+        from backend import benchmark
+        benchmark.run(args.benchmark, args.port, args.events)
     elif(args.interface is not False):
         import interface
         interface.start_interface(args.no_restore)
@@ -6,10 +6,20 @@
 from interface.Qt import QtGui, QtCore
 from zmq import SUB, REQ
 import zmq
+import numpy
 from interface.zmqsocket import ZmqSocket
 from interface.plotdata import PlotData
 import logging
 
+# Title of the messages packing the scalars and small vectors of an event,
+# see ipc.broadcast
+PACKED_TITLE = '__packed__'
+
+def packed_topic(title):
+    """Returns the topic subscribed to for the broadcast named title, which
+    asks the backend to pack it. See ipc.broadcast.packed_topic()"""
+    return '%s:%s' % (PACKED_TITLE, title)
+
 class DataSource(QtCore.QObject):
     """Manages a connection with one backend"""
     plotdata_added = QtCore.Signal(PlotData)
@@ -43,7 +53,7 @@ class DataSource(QtCore.QObject):
         if title not in self._subscribed_titles:
             self._subscribed_titles[title] = [plot]
             try:
-                self._data_socket.subscribe(bytes(title))
+                self._data_socket.subscribe(bytes(packed_topic(title)))
                 self.subscribed.emit(title)
                 logging.debug("Subscribing to %s on %s.", title, self.name())
             # socket might still not exist
@@ -58,7 +68,7 @@ class DataSource(QtCore.QObject):
         self._subscribed_titles[title].remove(plot)
         # Check if list is empty
         if not self._subscribed_titles[title]:
-            self._data_socket.unsubscribe(bytes(title))
+            self._data_socket.unsubscribe(bytes(packed_topic(title)))
             self.unsubscribed.emit(title)
             logging.debug("Unsubscribing from %s on %s.", title, self.name())
             self._subscribed_titles.pop(title)
@@ -71,7 +81,7 @@ class DataSource(QtCore.QObject):
         if title not in self._recorded_titles:
             self._recorded_titles[title] = True
             try:
-                self._data_socket.subscribe(bytes(title))
+                self._data_socket.subscribe(bytes(packed_topic(title)))
                 self.subscribed.emit(title)
                 logging.debug("Subscribing to %s on %s.", title, self.name())
             # socket might still not exist
@@ -83,7 +93,7 @@ class DataSource(QtCore.QObject):
         If no one else is associated with it unsubscrine"""
         self._recorded_titles[title] = False
         if not title in self._subscribed_titles:
-            self._data_socket.unsubscribe(bytes(title))
+            self._data_socket.unsubscribe(bytes(packed_topic(title)))
             self.unsubscribed.emit(title)
             logging.debug("Unsubscribing from %s on %s.", title, self.name())
             self._recorded_titles.pop(title)
@@ -131,9 +141,11 @@ class DataSource(QtCore.QObject):
             self._data_socket.ready_read.connect(self._get_broadcast)
             self._data_socket.connect_socket(addr, self._ssh_tunnel)
             self.parent().add_backend(self)
+            # The scalars and small vectors of every event come packed together
+            self._data_socket.subscribe(bytes(PACKED_TITLE))
             # Subscribe to stuff already requested
             for title in self._subscribed_titles.keys():
-                self._data_socket.subscribe(bytes(title))
+                self._data_socket.subscribe(bytes(packed_topic(title)))
                 self.subscribed.emit(title)
                 logging.debug("Subscribing to %s on %s.", title, self.name())
             self.query_configuration()
@@ -182,6 +194,15 @@ class DataSource(QtCore.QObject):
         cmd = payload[1]
         title = payload[2]
         data = payload[3]
+        if(cmd == 'packed'):
+            for title, data, data_x, conf, is_array in data:
+                # Packed messages hold the data of all the interfaces
+                if title not in self._subscribed_titles and title not in self._recorded_titles:
+                    continue
+                if is_array:
+                    data = numpy.array(data)
+                self._process_broadcast([payload[0], 'new_data', title, data, data_x, conf])
+            return
         if(title not in self.conf):
             # We're getting data we were not expecting
             # Let's discard it and order an immediate reconfigure
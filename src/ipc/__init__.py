@@ -1,13 +1,16 @@
 """Handles the communication between the backend<->interface, as well
 as the MPI communication between different backend processes."""
-from ipc.zmqserver import ZmqServer
+from ipc.zmqserver import ZmqServer, ZmqPublisher
 import socket
+import atexit
 import mpi
 
 _server = None
 hostname = socket.gethostname()
 port = None
 uuid = None
+# Publishes the data of a slave directly to the ZmqServer, if state['zmq_direct'] is set
+publisher = None
 
 def zmq():
     """Returns the ZmqServer for process.
@@ -18,4 +21,22 @@ def zmq():
         _server = ZmqServer(port)
     return _server
 
+def init_publisher(state):
+    """Connects every slave directly to the broker of the ZmqServer, if
+    ``state['zmq_direct']`` is set, such that the data of the slaves does not
+    have to go through the master. Has to be called by all the processes."""
+    global publisher, uuid # pylint: disable=global-statement
+    if mpi.comm is None or not state.get('zmq_direct', False):
+        return
+    if mpi.is_zmqserver():
+        mpi.comm.bcast((zmq().xsub_address, uuid), root=0)
+    else:
+        address, uuid = mpi.comm.bcast(None, root=0)
+        publisher = ZmqPublisher(address)
+        # Otherwise the socket is only closed once zmq is gone
+        atexit.register(publisher.close)
+
 from ipc.broadcast import new_data, set_current_event # pylint: disable=unused-import
+import ipc.stats # pylint: disable=unused-import
+import ipc.reduction # pylint: disable=unused-import
+import ipc.counter # pylint: disable=unused-import
@@ -7,16 +7,51 @@ import numpy
 import ipc
 import logging
 import hashlib
+import time
+import threading
 
 evt = None
 data_conf = {}
 sent_time = {}
+_local = threading.local()
+# Title of the messages packing the scalars and small vectors of an event
+PACKED_TITLE = '__packed__'
+# Largest number of elements of a vector which is packed
+pack_max_size = 64
+
+def collect(outbox):
+    """Makes the broadcasts of the calling thread be appended to the given
+    outbox list instead of being sent, until collect(None) is called.
+    They can then be sent later, in order, with replay()."""
+    _local.outbox = outbox
+
+def collecting():
+    """Returns True if the broadcasts of the calling thread are collected"""
+    return getattr(_local, 'outbox', None) is not None
+
+def replay(_evt, outbox):
+    """Sends the broadcasts collected in outbox for the given event"""
+    set_current_event(_evt)
+    for func, args, kwds in outbox:
+        func(*args, **kwds)
+    flush()
+
+def _defer(func, *args, **kwds):
+    """Appends the call to the outbox of the calling thread, if any.
+    Returns True if the call was deferred."""
+    outbox = getattr(_local, 'outbox', None)
+    if outbox is None:
+        return False
+    outbox.append((func, args, kwds))
+    return True
 
 
 def init_data(title, **kwds):
     """Configures the data broadcast named title. All the keyword=value
     pairs given will be set in the configuration dictionary for that broadcast,
     which are then available at the interface."""
+    if _defer(init_data, title, **kwds):
+        return
     if(title in data_conf.keys()):
         data_conf[title].update(kwds)
     else:
@@ -51,8 +86,14 @@ def new_data(title, data_y, mpi_reduce=False, **kwds):
     """Send a new data item, which will be appended to any existing
     values at the interface. If mpi_reduce is True data_y will be
     summed over all the slaves. All keywords pairs given will also be
-    transmitted and available at the interface."""
+    transmitted and available at the interface.
+
+    Data sent from onBatch() is attributed to the last event of the
+    batch, and the ids of all its events are sent as the event_ids
+    keyword."""
     global sent_time
+    if _defer(new_data, title, data_y, mpi_reduce, **kwds):
+        return
     _check_type(title, data_y)
     event_id = evt.event_id()
 
@@ -70,22 +111,98 @@ def new_data(title, data_y, mpi_reduce=False, **kwds):
             # do not send the data
             return
 
+    if not mpi_reduce and hasattr(evt, 'event_ids'):
+        kwds['event_ids'] = evt.event_ids().tolist()
+
+    t0 = time.time()
+    packed = not mpi_reduce and _pack(title, data_y, event_id, kwds)
     if(ipc.mpi.is_slave()):
         if(mpi_reduce):
             ipc.mpi.send_reduce(title, 'new_data', data_y, event_id, **kwds)
         else:
-            m = hashlib.md5()
-            m.update(bytes(title))
-            if m.digest() in ipc.mpi.subscribed:
-                ipc.mpi.send(title, [ipc.uuid, 'new_data', title, data_y,
-                                     event_id, kwds])
-            else:
+            topics = _topics(title, packed)
+            for topic in topics:
+                if ipc.publisher is not None:
+                    ipc.publisher.send(topic, [ipc.uuid, 'new_data', title, data_y,
+                                               event_id, kwds])
+                else:
+                    ipc.mpi.send(topic, [ipc.uuid, 'new_data', title, data_y,
+                                         event_id, kwds])
+            if not topics and not packed:
                 logging.debug('%s not subscribed, not sending' % (title))
     else:
-        ipc.zmq().send(title, [ipc.uuid, 'new_data', title, data_y,
-                               event_id, kwds])
-        logging.debug("Sending data on source '%s'" % title)
-        
+        for topic in _topics(title, packed):
+            ipc.zmq().send(topic, [ipc.uuid, 'new_data', title, data_y,
+                                   event_id, kwds])
+            logging.debug("Sending data on source '%s'" % title)
+    ipc.stats.add('new_data', time.time() - t0)
+
+def packed_topic(title):
+    """Returns the topic interfaces which accept packed messages subscribe
+    to for the broadcast named title, instead of the title itself"""
+    return '%s:%s' % (PACKED_TITLE, title)
+
+def _topics(title, packed):
+    """Returns the topics the unpacked data of the broadcast named title must
+    be sent with: the title, for the interfaces subscribed to it directly,
+    and its packed topic, if the data could not be packed"""
+    topics = []
+    if _is_subscribed(title):
+        topics.append(title)
+    if not packed and _is_subscribed(packed_topic(title)):
+        topics.append(packed_topic(title))
+    return topics
+
+def _is_subscribed(title):
+    """Returns True if any interface subscribed to the broadcast named title"""
+    m = hashlib.md5()
+    m.update(bytes(title))
+    if(ipc.mpi.is_slave()):
+        return m.digest() in ipc.mpi.subscribed
+    return m.digest() in ipc.zmq().subscribed
+
+def _pack(title, data_y, event_id, kwds):
+    """Adds scalars and small vectors to the packed message of the current
+    event, if an interface subscribed to the packed topic of the title.
+    Returns True if the data was packed, and will be sent by flush().
+    Interfaces subscribed to the title itself, which do not know about
+    packed messages, still get the data unpacked."""
+    is_array = isinstance(data_y, numpy.ndarray)
+    if is_array and (data_y.ndim != 1 or data_y.size > pack_max_size):
+        return False
+    if not _is_subscribed(packed_topic(title)):
+        return False
+    # The packed message is sent as JSON
+    if is_array:
+        data_y = data_y.tolist()
+    elif isinstance(data_y, numpy.number):
+        data_y = data_y.item()
+    if isinstance(event_id, numpy.number):
+        event_id = event_id.item()
+    packed = getattr(_local, 'packed', None)
+    if packed is None:
+        packed = _local.packed = []
+    packed.append([title, data_y, event_id, kwds, is_array])
+    return True
+
+def flush():
+    """Sends the scalars and small vectors broadcast since the last call
+    as a single message"""
+    packed = getattr(_local, 'packed', None)
+    if not packed:
+        return
+    _local.packed = None
+    t0 = time.time()
+    msg = [ipc.uuid, 'packed', PACKED_TITLE, packed, None, {}]
+    if(ipc.mpi.is_slave()):
+        if ipc.publisher is not None:
+            ipc.publisher.send(PACKED_TITLE, msg)
+        else:
+            ipc.mpi.send(PACKED_TITLE, msg)
+    else:
+        ipc.zmq().send(PACKED_TITLE, msg)
+    ipc.stats.add('new_data', time.time() - t0)
+
 def set_current_event(_evt):
     """Updates the current event, such that it can
     be accessed easily in analysis code"""
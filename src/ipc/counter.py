@@ -0,0 +1,81 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Counts values over a window of events on every worker and merges the
+counts of all the workers regularly, e.g.::
+
+    hits = ipc.counter.WindowedCounter('hits', window=100)
+
+    def onEvent(evt):
+        hits.add(is_hit)
+        print "Hit rate %.1f %% at %.1f Hz" % (100*hits.fraction, hits.rate)
+
+Adding a value takes constant time and never waits for the other workers.
+The counts of all the counters are merged together every
+``state['reduce_interval']`` seconds (see :func:`ipc.mpi.periodic_sum`),
+so the workers can add values to any counters, in any order, on any
+events and from any thread.
+"""
+import time
+import threading
+import collections
+import ipc
+
+class WindowedCounter(object):
+    """Sum, number and rate of the last window values added on every worker.
+
+    Args:
+        :name(str):     Name of the counter, the same on all the workers
+
+    Kwargs:
+        :window(int):   Number of values kept on every worker, default = 100
+        :clock(function): Returns the time in seconds when a value is added,
+                          default = time.time
+    """
+    def __init__(self, name, window=100, clock=time.time):
+        self.name = name
+        self.window = window
+        self.clock = clock
+        self._values = collections.deque()
+        self._sum = 0
+        self._lock = threading.Lock()
+        # The merged counts of all the workers, the counts of this worker
+        # until the first merge
+        self.total = 0
+        self.count = 0
+        self.rate = 0.
+        self.timestamp = None
+
+    def add(self, value=1):
+        """Adds a value, e.g. True for a hit or 1 for an event"""
+        with self._lock:
+            now = self.clock()
+            if len(self._values) == self.window:
+                self._sum -= self._values.popleft()[0]
+            self._values.append((value, now))
+            self._sum += value
+            counts = [self._sum, len(self._values), self._local_rate()]
+            merged = ipc.mpi.periodic_sum(self.name, counts)
+            if merged is None:
+                merged = counts
+            else:
+                self.timestamp = ipc.mpi.periodic_timestamp(self.name)
+            self.total, self.count, self.rate = merged
+            self.count = int(self.count)
+
+    def local_rate(self):
+        """Values per second added on this worker over its window"""
+        with self._lock:
+            return self._local_rate()
+
+    def _local_rate(self):
+        if len(self._values) < 2:
+            return 0.
+        dt = self._values[-1][1] - self._values[0][1]
+        return (len(self._values) - 1)/dt if dt > 0 else 0.
+
+    @property
+    def fraction(self):
+        """Merged sum divided by the merged number of values, e.g. the hit rate"""
+        return self.total / float(self.count) if self.count else 0.
@@ -8,9 +8,20 @@ import numpy
 import numbers
 import logging
 import time
+import threading
+import cPickle as pickle
 
 reducedata = {}
 slavesdone = []
+workqueues = {}
+# Serializes the request/reply exchanges with the master of different threads
+_request_lock = threading.Lock()
+# Keeps the header and the arrays of a message sent by send() together
+_send_lock = threading.Lock()
+# Arrays the master receives the arrays sent by the slaves into
+_array_buffers = {}
+# Arrays smaller than this are pickled together with the rest of the message
+ARRAY_MIN_BYTES = 4096
 
 def is_master():
     """Returns True if the process has MPI rank 0 and
@@ -45,15 +56,24 @@ try:
         slave_group = comm.Get_group().Incl(range(1, size))
         slaves_comm = comm.Create(slave_group)
         reload_comm = comm.Clone()
+        # Separate communicator for the ticks of periodic_sum(), such that
+        # they can not be mixed up with the blocking reductions
+        if rank > 0:
+            nonblocking_comm = slaves_comm.Dup()
+        else:
+            nonblocking_comm = None
         MPI_TAG_INIT   = 1 + 4353
         MPI_TAG_EXPAND = 2 + 4353
         MPI_TAG_READY  = 3 + 4353
         MPI_TAG_CLOSE  = 4 + 4353        
+        MPI_TAG_WORK   = 5 + 4353
+        MPI_TAG_ARRAY  = 6 + 4353
     else:
         # If there's only 1 rank, no not use MPI
         comm = None
         slaves_comm = None
         reload_comm = None
+        nonblocking_comm = None
 
 
 except ImportError:
@@ -62,8 +82,14 @@ except ImportError:
     comm = None
     slaves_comm = None
     reload_comm = None
+    nonblocking_comm = None
 
 subscribed = set()
+# True while the master is too busy to forward all the data of the slaves
+congested = False
+# Time the master spent waiting for messages since _load_start
+_load_start = None
+_load_waited = 0.
 
 def slave_rank():
     if size > 1:
@@ -88,12 +114,48 @@ def is_main_worker():
     return is_main_slave() or size == 1
 
 def send(title, data):
-    """Send a list of data items to the master node."""
-    if comm is not None:
+    """Send a list of data items to the master node.
+
+    Large numpy arrays in the list are not pickled, but sent as raw
+    buffers after a header describing them."""
+    if comm is None:
+        return
+    arrays = []
+    if isinstance(data, list):
+        for i in range(len(data)):
+            if(isinstance(data[i], numpy.ndarray) and data[i].dtype != object and
+               data[i].nbytes >= ARRAY_MIN_BYTES):
+                arrays.append((i, numpy.ascontiguousarray(data[i])))
+    if not arrays:
         comm.send([title, data], 0)
+        return
+    data = list(data)
+    specs = []
+    for i, array in arrays:
+        data[i] = None
+        specs.append((i, array.shape, array.dtype.str))
+    with _send_lock:
+        comm.send(['__arrays__', title, data, specs], 0)
+        for i, array in arrays:
+            comm.Send([array, MPI.BYTE], 0, tag=MPI_TAG_ARRAY)
+
+def _recv_arrays(msg, source):
+    """Receives the arrays announced by the header msg from source, into
+    buffers which are reused for the following messages, and returns the
+    message as sent to send()."""
+    _, title, data, specs = msg
+    for i, shape, dtype in specs:
+        # One buffer per array of a broadcast, replaced when its shape changes
+        key = (source, title, i)
+        array = _array_buffers.get(key)
+        if array is None or array.shape != tuple(shape) or array.dtype != numpy.dtype(dtype):
+            array = _array_buffers[key] = numpy.empty(shape, dtype=dtype)
+        comm.Recv([array, MPI.BYTE], source, tag=MPI_TAG_ARRAY)
+        data[i] = array
+    return [title, data]
 
 def checkreload():
-    global subscribed
+    global subscribed, congested
 
     if ipc.zmq() is not None:
         if ipc.zmq().reloadmaster == True:
@@ -111,14 +173,23 @@ def checkreload():
             elif(msg[0] == '__subscribed__'):
                 logging.debug('Got subscribed %s' % msg[1])
                 subscribed = msg[1]
+            elif(msg[0] == '__congested__'):
+                logging.debug('Got congested %s' % msg[1])
+                congested = msg[1]
     return False
 
-def master_loop():
+def master_loop(reduction_file=None):
     """Run the main loop on the master process.
     It retransmits all received messages using its zmqserver
-    and handles any possible reductions."""
+    and handles any possible reductions. The accumulators of
+    ipc.reduction are written to reduction_file, if given."""
     status = MPI.Status()
-    msg = comm.recv(None, MPI.ANY_SOURCE, status = status)
+    t0 = time.time()
+    # Messages from send() and requests use the default tag, 0
+    msg = comm.recv(None, MPI.ANY_SOURCE, 0, status = status)
+    _check_congestion(time.time() - t0)
+    if(msg[0] == '__arrays__'):
+        msg = _recv_arrays(msg, status.Get_source())
     if(msg[0] == '__data_conf__'):
         ipc.broadcast.data_conf.update(msg[1])
     elif(msg[0] == '__reduce__'):
@@ -142,16 +213,70 @@ def master_loop():
             for data in reducedata[cmd]:
                 data_y = data_y + reducedata[cmd][data]
             comm.send(data_y, source)
+    elif(msg[0] == '__work__'):
+        comm.send(_next_chunk(*msg[1:]), status.Get_source(), tag=MPI_TAG_WORK)
+    elif(msg[0] == '__stats__'):
+        ipc.stats.ranks[msg[1][0]] = msg[1][1]
     elif(msg[0] == '__exit__'):
         slavesdone.append(True)
         logging.warning("Slave with rank = %d reports to be done" %msg[1])
         if len(slavesdone) == nr_workers():
+            ipc.reduction.run(reduction_file)
             MPI.Finalize()
             return True
     else:
         # Inject a proper UUID
         msg[1][0] = ipc.uuid
+        t0 = time.time()
         ipc.zmq().send(msg[0], msg[1])
+        ipc.stats.add('zmq_send', time.time() - t0)
+
+def _check_congestion(waited, interval=1.):
+    """Keeps track of the fraction of the time the master is busy. When it is
+    busy nearly all the time the data of the slaves piles up, and they are
+    told to skip low priority stages (see backend.scheduler) until it recovered."""
+    global congested, _load_start, _load_waited # pylint: disable=global-statement
+    now = time.time()
+    if _load_start is None:
+        _load_start = now
+    _load_waited += waited
+    if now - _load_start < interval:
+        return
+    busy = 1. - _load_waited/(now - _load_start)
+    _load_start = now
+    _load_waited = 0.
+    if (busy > 0.9 and not congested) or (busy < 0.7 and congested):
+        congested = not congested
+        logging.warning("Master is %s congested (busy %.0f%% of the time)",
+                        "" if congested else "no longer", 100*busy)
+        for i in xrange(1, size):
+            reload_comm.send(['__congested__', congested], i)
+
+def thread_multiple():
+    """Returns True if MPI can be called from several threads at once"""
+    if comm is None:
+        return True
+    return MPI.Query_thread() == MPI.THREAD_MULTIPLE
+
+def request_work(name, total, chunk_size, offset=0):
+    """Returns the next chunk of indices, as a (start, stop) tuple, of the
+    work queue called name, which goes from offset up to total. Returns None
+    when all the work has been handed out. The chunks are handed out by the
+    master on request, such that faster slaves get more work."""
+    if comm is None:
+        return _next_chunk(name, total, chunk_size, offset)
+    with _request_lock:
+        comm.send(['__work__', name, total, chunk_size, offset], 0)
+        return comm.recv(None, 0, tag=MPI_TAG_WORK)
+
+def _next_chunk(name, total, chunk_size, offset):
+    """Hands out the next chunk of the work queue called name"""
+    start = workqueues.get(name, offset)
+    if start >= total:
+        return None
+    stop = min(start + chunk_size, total)
+    workqueues[name] = stop
+    return (start, stop)
 
 def send_reduce(title, cmd, data_y, data_x, **kwds):
     """Reduce data and send it to the master. Not currently used, maybe
@@ -177,21 +302,260 @@ def sum(cmd, array):
     if size == 1:
         return
 
-    if(isinstance(array, numbers.Number)):
-        comm.send(['__reduce__', cmd, (), array, is_main_slave()], 0)
-    else:
-        comm.send(['__reduce__', cmd, array.shape, array, is_main_slave()], 0)
-    
-    if not is_main_slave():
-        return None
+    with _request_lock:
+        if(isinstance(array, numbers.Number)):
+            comm.send(['__reduce__', cmd, (), array, is_main_slave()], 0)
+        else:
+            comm.send(['__reduce__', cmd, array.shape, array, is_main_slave()], 0)
 
-    databack = comm.recv(None, 0)
+        if not is_main_slave():
+            return None
+
+        databack = comm.recv(None, 0)
     if(isinstance(databack, numbers.Number)):
         array[()] = databack
     else:
         array[:] = databack[:]
     
 
+# The values of every worker for the sums of periodic_sum() and isum(), the
+# sums of all the workers at the last tick, with the time their values were
+# taken, and the sums which could not be merged, with the reason
+_periodic_lock = threading.Lock()
+_periodic_local = {}
+_periodic_merged = {}
+_periodic_failed = {}
+_periodic_warned = set()
+# The running tick (see _Tick), and when the last one started
+_tick = None
+_last_tick = None
+# Numbers of ticks started and finished, and the lock serializing the ticks
+# of the event loop with those driven by Reduction.wait()
+_ticks_started = 0
+_ticks_finished = 0
+_tick_lock = threading.RLock()
+
+def periodic_sum(name, array):
+    """Sets the value of this worker for the element-wise sum called name,
+    and returns the sum of all the workers as of the last tick (see tick()),
+    or None if there was none yet. Never waits for the other workers, and
+    can be called for any names, in any order and from any thread."""
+    isum(name, array)
+    with _periodic_lock:
+        merged = _periodic_merged.get(name)
+        failed = _periodic_failed.get(name)
+    if failed is not None and name not in _periodic_warned:
+        logging.warning("Cannot merge %s, %s", name, failed)
+        _periodic_warned.add(name)
+    if merged is None:
+        return None
+    return merged[1]
+
+class Reduction(object):
+    """Handle of a sum across all the workers started by :func:`isum`,
+    which completes with the tick merging its value."""
+    def __init__(self, name, tick_nr):
+        self.name = name
+        self._tick_nr = tick_nr
+
+    def test(self):
+        """Returns True if the tick merging the value completed"""
+        if self._tick_nr is None:
+            return True
+        with _tick_lock:
+            if _tick is not None and _ticks_started >= self._tick_nr:
+                _tick.advance(False)
+            return _ticks_finished >= self._tick_nr
+
+    def wait(self):
+        """Waits for the tick merging the value, starting it if it is not
+        running yet, and returns the sum. The other workers take part in it
+        with their next tick, so it can take up to state['reduce_interval']
+        seconds."""
+        if self._tick_nr is not None:
+            with _tick_lock:
+                while _ticks_finished < self._tick_nr:
+                    if _tick is None:
+                        _start_tick(False)
+                    _tick.advance(True)
+        return self.result
+
+    @property
+    def result(self):
+        """The sum of all the workers of the tick merging the value, or of a
+        later one, None while it did not complete. Raises ValueError if the
+        workers gave values of different shapes or types."""
+        if not self.test():
+            return None
+        with _periodic_lock:
+            merged = _periodic_merged.get(self.name)
+            failed = _periodic_failed.get(self.name)
+        if failed is not None:
+            raise ValueError("Cannot merge %s, %s" % (self.name, failed))
+        if merged is None:
+            return None
+        return merged[1]
+
+def isum(name, array):
+    """Sets the value of this worker for the element-wise sum called name,
+    like periodic_sum(), and returns a Reduction which completes once the
+    value is merged with those of the other workers. Polling it with
+    Reduction.test() never waits for the other workers. The value can be
+    a number or a numeric numpy array of any shape, whose type is kept."""
+    # The value may change while it is being merged
+    array = numpy.array(array)
+    if array.dtype.kind == 'b':
+        array = array.astype(numpy.int64)
+    if array.dtype.kind not in 'iufc':
+        raise TypeError("Cannot sum %s, only numbers and numeric arrays can be summed, not %s"
+                        % (name, array.dtype))
+    if nonblocking_comm is None:
+        with _periodic_lock:
+            _periodic_merged[name] = (time.time(), array)
+        return Reduction(name, None)
+    with _periodic_lock:
+        _periodic_local[name] = array
+        # The value goes with the next tick started
+        return Reduction(name, _ticks_started + 1)
+
+def periodic_timestamp(name):
+    """Returns the time the values of the last sum called name were taken,
+    the latest of all the workers, or None if there was none yet"""
+    with _periodic_lock:
+        merged = _periodic_merged.get(name)
+    if merged is None:
+        return None
+    return merged[0]
+
+def tick(interval=1.):
+    """Starts merging the values given to periodic_sum() and isum() of all
+    the workers, if the last merge completed at least interval seconds ago.
+    The values are merged with non-blocking collectives, such that the
+    workers do not wait for each other. Called by the event loop of the
+    slaves after every event."""
+    global _last_tick # pylint: disable=global-statement
+    if nonblocking_comm is None:
+        return
+    with _tick_lock:
+        if _last_tick is None:
+            # The first merge is one interval after the first event
+            _last_tick = time.time()
+            return
+        if _tick is not None and _tick.advance(False) is None:
+            return
+        if time.time() - _last_tick >= interval:
+            _start_tick(False)
+
+def drain():
+    """Keeps taking part in the ticks of the other workers until all of
+    them are done, such that no tick is left unmatched. Has to be called by
+    every slave at the end of its run."""
+    if nonblocking_comm is None:
+        return
+    with _tick_lock:
+        while True:
+            if _tick is not None and _tick.advance(True):
+                return
+            _start_tick(True)
+
+def _start_tick(done):
+    """Starts merging the values of all the workers, telling them
+    whether this worker is done"""
+    global _tick, _last_tick, _ticks_started # pylint: disable=global-statement
+    _last_tick = time.time()
+    with _periodic_lock:
+        _ticks_started += 1
+        values = dict(_periodic_local)
+    _tick = _Tick(values, done, _last_tick)
+
+def _icollective(name, *args, **kwds):
+    """Starts the non-blocking collective called name (e.g. 'Iallreduce')
+    on nonblocking_comm and returns its request. MPI-2 libraries only have
+    blocking collectives, which are run instead, returning None."""
+    func = getattr(nonblocking_comm, name, None)
+    if func is not None:
+        return func(*args, **kwds)
+    getattr(nonblocking_comm, name[1:].capitalize())(*args, **kwds)
+    return None
+
+class _Tick(object):
+    """Merges the values of all the workers in three non-blocking steps,
+    which all the workers start in the same order:
+
+    - gather whether the workers are done, the time and the size of the
+      description of their values,
+    - gather the descriptions, the names, types and shapes of the values,
+    - sum the values of every name, in the order of the names, with zeros
+      for the workers which have no value for it. Names whose values differ
+      in type or shape between the workers are not summed.
+    """
+    def __init__(self, values, done, timestamp):
+        self._values = values
+        self._header = numpy.frombuffer(pickle.dumps(
+            sorted([(name, v.dtype.str, v.shape) for name, v in values.items()]), 2), numpy.uint8)
+        self._counts = numpy.empty((nonblocking_comm.Get_size(), 3))
+        # The buffers have to be kept until the collectives completed
+        self._sendbuf = numpy.array([done, timestamp, self._header.size], dtype=numpy.float64)
+        self._requests = [_icollective('Iallgather', self._sendbuf, self._counts)]
+        self._step = self._gather_headers
+
+    def advance(self, wait):
+        """Goes on with the tick as far as possible, waiting for the other
+        workers if wait is True. Returns None while the tick is running,
+        otherwise whether all the workers are done."""
+        while self._step is not None:
+            requests = [r for r in self._requests if r is not None]
+            if wait:
+                MPI.Request.Waitall(requests)
+            elif requests and not MPI.Request.Testall(requests):
+                return None
+            self._requests = []
+            self._step = self._step()
+        return int(self._counts[:, 0].sum()) == len(self._counts)
+
+    def _gather_headers(self):
+        sizes = self._counts[:, 2].astype(int)
+        offsets = numpy.concatenate([[0], numpy.cumsum(sizes)[:-1]])
+        self._headers = numpy.empty(sizes.sum(), dtype=numpy.uint8)
+        self._requests = [_icollective('Iallgatherv', [self._header, MPI.BYTE],
+                                       [self._headers, (sizes, offsets), MPI.BYTE])]
+        self._sizes = sizes
+        self._offsets = offsets
+        return self._sum_values
+
+    def _sum_values(self):
+        specs = {}
+        for offset, size in zip(self._offsets, self._sizes):
+            for name, dtype, shape in pickle.loads(self._headers[offset:offset+size].tostring()):
+                specs.setdefault(name, set()).add((dtype, tuple(shape)))
+        self._sums = []
+        self._failed = {}
+        for name in sorted(specs):
+            if len(specs[name]) > 1:
+                self._failed[name] = "the workers have values of different types or shapes"
+                continue
+            dtype, shape = specs[name].pop()
+            value = self._values.get(name)
+            if value is None:
+                value = numpy.zeros(shape, dtype=dtype)
+            sendbuf = numpy.ascontiguousarray(value).reshape(-1)
+            recvbuf = numpy.empty_like(sendbuf)
+            self._requests.append(_icollective('Iallreduce', sendbuf, recvbuf, op=MPI.SUM))
+            self._sums.append((name, shape, sendbuf, recvbuf))
+        return self._finish
+
+    def _finish(self):
+        global _tick, _ticks_finished # pylint: disable=global-statement
+        timestamp = self._counts[:, 1].max()
+        with _periodic_lock:
+            for name, shape, _, recvbuf in self._sums:
+                _periodic_merged[name] = (timestamp, recvbuf.reshape(shape))
+                _periodic_failed.pop(name, None)
+            _periodic_failed.update(self._failed)
+            _ticks_finished += 1
+        _tick = None
+        return None
+
 def max(array):
     """Element-wise max of a numpy array across all the slave processes.
     The result is only available in the main_slave (rank 1)."""
@@ -227,5 +591,10 @@ def _reduce(array, op):
         else:
             slaves_comm.Reduce(array,  None, op=getattr(MPI,op))
 
-def slave_done():
+def slave_done(reduction_file=None):
+    """Reports to the master that this worker is done and takes
+    part in the reduction of the accumulators (see ipc.reduction),
+    which are written to reduction_file, if given"""
+    drain()
     send('__exit__', rank)
+    ipc.reduction.run(reduction_file)
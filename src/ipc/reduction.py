@@ -0,0 +1,169 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Combines the accumulators of all the workers once they are all done.
+
+Accumulators are registered in the configuration file, with a function
+returning their value at the end of the run, e.g.::
+
+    ipc.reduction.register('nr_hits', lambda: nr_hits)
+    ipc.reduction.register('max_image', lambda: max_image, op='max')
+    ipc.reduction.register('mean_image', lambda: mean_image, op='mean',
+                           count=lambda: nr_events)
+    ipc.reduction.register('hit_sizes', lambda: numpy.array(sizes), op='gather')
+
+When all the workers are done their values are combined on rank 0, where they
+are available in ``ipc.reduction.results`` and written to the HDF5 file
+``state['reduction_file']``, if given. Workers which have no value (i.e. the
+getter returns None, e.g. because they did not get any events) are left out.
+Accumulators whose getter raised an error on any worker are not combined.
+"""
+import logging
+import numpy
+import ipc
+
+# name -> (getter, op, count)
+registered = {}
+# The combined values, only available on rank 0
+results = {}
+
+OPS = ('sum', 'max', 'min', 'mean', 'gather')
+
+def register(name, getter, op='sum', count=None):
+    """Registers an accumulator to be combined at the end of the run.
+
+    Args:
+        :name(str):     Name of the result, also used as dataset name in the output file
+        :getter:        Function returning the value of this worker, a number or a numpy array
+
+    Kwargs:
+        :op(str):       'sum', 'max', 'min' (element-wise), 'mean' or 'gather'
+        :count:         Function returning the number of events the value of this worker
+                        is the mean of (only for 'mean', default is to weigh all workers equally)
+
+    'gather' concatenates the arrays of all the workers along the first axis,
+    in the order of the ranks, or makes an array of scalar values.
+    """
+    if op not in OPS:
+        raise ValueError("Reduction op must be one of %s, not %s" % (OPS, op))
+    registered[name] = (getter, op, count)
+
+def run(filename=None):
+    """Combines the registered accumulators of all the workers into results,
+    and writes them to the HDF5 file filename, if given. Has to be called by
+    all the processes once they are done."""
+    local = {}
+    meta = {}
+    if ipc.mpi.is_worker():
+        for name, (getter, op, count) in registered.items():
+            try:
+                value = getter()
+                if value is None:
+                    continue
+                value = numpy.asarray(value)
+                local[name] = (value, count() if count is not None else 1)
+                meta[name] = (op, value.shape, value.dtype.str)
+            except Exception: # pylint: disable=broad-except
+                # Still take part in the collectives, which the others expect
+                logging.warning("Cannot get the value of %s", name, exc_info=True)
+                local.pop(name, None)
+                meta[name] = None
+
+    if ipc.mpi.comm is None:
+        for name, (value, _) in local.items():
+            results[name] = _combine(meta[name][0], [value])
+    else:
+        # Every rank has to take part in the same collective
+        # operations, so all ranks need to know what the others have
+        all_meta = ipc.mpi.comm.allgather(meta)
+        names = set()
+        for m in all_meta:
+            names.update(m.keys())
+        for name in sorted(names):
+            described = [m[name] for m in all_meta if name in m]
+            if None in described:
+                if ipc.mpi.is_zmqserver():
+                    logging.warning("Cannot reduce %s, getting its value failed "
+                                    "on some workers", name)
+                continue
+            if any([_kind(d) != _kind(described[0]) for d in described]):
+                if ipc.mpi.is_zmqserver():
+                    logging.warning("Cannot reduce %s, the workers have different "
+                                    "kinds of values: %s", name, described)
+                continue
+            value, count = local.get(name, (None, 0))
+            _reduce(name, described[0], value, count)
+
+    if ipc.mpi.is_zmqserver() and filename is not None and results:
+        write(filename)
+
+def _kind(meta):
+    """Returns what has to be the same for the values of all the workers
+    to be combined"""
+    op, shape, dtype = meta
+    if op == 'gather':
+        # Concatenated along the first axis, which can differ in length
+        return (op, len(shape), shape[1:], dtype)
+    return meta
+
+def _reduce(name, meta, value, count):
+    """Combines the values of all the ranks on rank 0 using MPI"""
+    MPI = ipc.mpi.MPI
+    comm = ipc.mpi.comm
+    op, shape, dtype = meta
+    root = comm.Get_rank() == 0
+    if op == 'gather':
+        values = comm.gather(value, root=0)
+        if root:
+            results[name] = _combine(op, [v for v in values if v is not None])
+        return
+    if op == 'mean':
+        dtype = numpy.float64
+        if value is not None:
+            value = value*count
+        counts = comm.reduce(count, op=MPI.SUM, root=0)
+    if value is None:
+        # Contribute the identity of the operation
+        value = numpy.empty(shape, dtype=dtype)
+        if op == 'max':
+            value.fill(_extreme(value.dtype, False))
+        elif op == 'min':
+            value.fill(_extreme(value.dtype, True))
+        else:
+            value.fill(0)
+    sendbuf = numpy.array(value, dtype=dtype, ndmin=1)
+    recvbuf = numpy.empty_like(sendbuf) if root else None
+    mpi_op = {'sum': MPI.SUM, 'mean': MPI.SUM, 'max': MPI.MAX, 'min': MPI.MIN}[op]
+    comm.Reduce(sendbuf, recvbuf, op=mpi_op, root=0)
+    if root:
+        result = recvbuf.reshape(shape)
+        if op == 'mean':
+            result = result/counts if counts else result*numpy.nan
+        results[name] = result
+
+def _combine(op, values):
+    """Combines the values of a single process"""
+    if op == 'gather':
+        if not values:
+            return numpy.array([])
+        if values[0].ndim == 0:
+            return numpy.array(values)
+        return numpy.concatenate(values)
+    return values[0]
+
+def _extreme(dtype, largest):
+    """Returns the largest or smallest value of the given dtype"""
+    if dtype.kind in 'iu':
+        info = numpy.iinfo(dtype)
+    else:
+        info = numpy.finfo(dtype)
+    return info.max if largest else info.min
+
+def write(filename):
+    """Writes the results to an HDF5 file"""
+    import h5py
+    with h5py.File(filename, 'w') as f:
+        for name, value in results.items():
+            f[name] = value
+    logging.warning("Wrote reduction of %s to %s", ", ".join(sorted(results)), filename)
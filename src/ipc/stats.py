@@ -0,0 +1,111 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Keeps track of the time spent in the different stages of the backend
+and publishes it, such that it is possible to see what limits the rate."""
+import time
+import threading
+import numpy
+import ipc
+
+stages = {}
+# Keep every measurement, needed for percentiles(), e.g. when benchmarking
+keep_samples = False
+# The last summary of every rank, only available on the zmqserver
+ranks = {}
+_last_publish = None
+# add() is called from the reading, analysis and main threads
+_lock = threading.Lock()
+
+class Stage(object):
+    """Accumulates the time spent in one stage"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.skipped = 0
+        self.samples = []
+
+    def add(self, dt):
+        """Adds one measurement, given in seconds"""
+        if keep_samples:
+            self.samples.append(dt)
+        self.count += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+
+def add(name, dt):
+    """Adds dt seconds spent in the stage called name"""
+    with _lock:
+        if name not in stages:
+            stages[name] = Stage()
+        stages[name].add(dt)
+
+def skip(name):
+    """Counts one skipped run of the stage called name"""
+    with _lock:
+        if name not in stages:
+            stages[name] = Stage()
+        stages[name].skipped += 1
+
+def percentiles(name, q=(50, 90, 99)):
+    """Returns the given percentiles, in ms, of the time spent in the stage
+    called name. Requires keep_samples to be True."""
+    samples = stages[name].samples
+    if not samples:
+        return [None]*len(q)
+    return [1000.*float(p) for p in numpy.percentile(samples, q)]
+
+def summary(interval):
+    """Returns the statistics of every stage, accumulated over the last interval
+    seconds, and starts accumulating anew"""
+    global stages # pylint: disable=global-statement
+    with _lock:
+        current = stages
+        stages = {}
+    values = {}
+    for name, stage in current.items():
+        values[name] = {'count': stage.count,
+                        'skipped': stage.skipped,
+                        'mean_ms': 1000.*stage.total/max(stage.count, 1),
+                        'max_ms': 1000.*stage.max,
+                        'load': stage.total/interval}
+    return values
+
+def publish(interval=5.):
+    """Publishes the statistics every interval seconds.
+
+    The summary of every rank is kept on the zmqserver, where it can be queried
+    with the ``stats`` command of the control socket. Workers also broadcast the
+    mean time of every stage as ``History(Time <stage>) - rank <rank>``, and the
+    number of skipped runs of stages which were skipped as
+    ``History(Skipped <stage>) - rank <rank>``."""
+    global _last_publish # pylint: disable=global-statement
+    if interval is None:
+        return
+    now = time.time()
+    if _last_publish is None:
+        _last_publish = now
+        return
+    if now - _last_publish < interval:
+        return
+    values = summary(now - _last_publish)
+    _last_publish = now
+    if ipc.mpi.is_zmqserver():
+        ranks[ipc.mpi.rank] = values
+    else:
+        ipc.mpi.send('__stats__', [ipc.mpi.rank, values])
+    if not ipc.mpi.is_worker() or ipc.broadcast.evt is None:
+        return
+    for name in sorted(values):
+        title = "History(Time %s) - rank %d" % (name, ipc.mpi.rank)
+        if title not in ipc.broadcast.data_conf:
+            ipc.broadcast.init_data(title, data_type='scalar', ylabel='Time [ms]', group='Timing')
+        ipc.new_data(title, values[name]['mean_ms'])
+        if values[name]['skipped']:
+            title = "History(Skipped %s) - rank %d" % (name, ipc.mpi.rank)
+            if title not in ipc.broadcast.data_conf:
+                ipc.broadcast.init_data(title, data_type='scalar', ylabel='Skipped', group='Timing')
+            ipc.new_data(title, values[name]['skipped'])
@@ -44,6 +44,8 @@ class ZmqServer(object):
         self._broker_pub_socket.bind("tcp://*:%d" % (self._broker_pub_port))
         self._broker_sub_socket.bind("tcp://*:%d" % (self._broker_sub_port))
         self._data_socket.connect("tcp://127.0.0.1:%d" % (self._broker_sub_port))
+        # Address other processes can publish to the broker on
+        self.xsub_address = "tcp://%s:%d" % (ipc.hostname, self._broker_sub_port)
 
         zmq.eventloop.ioloop.install()
         # We are installing event handlers for those sockets
@@ -71,43 +73,9 @@ class ZmqServer(object):
         t.start()
 
 
-    def _send_array(self, array, flags=0, copy=True, track=False):
-        """Send a numpy array with metadata"""
-        md = dict(
-            dtype=str(array.dtype),
-            shape=array.shape,
-            strides=array.strides,
-        )
-        if md['dtype'] == 'object':
-            raise ValueError('Cannot broadcast arrays with dtype=object')
-        self._data_socket.send_json(md, flags|zmq.SNDMORE)
-        return self._data_socket.send(array, flags, copy=copy, track=track)
-
     def send(self, title, data):
         """Send a list of data items to the broadcast named title"""
-        array_list = []
-        for i in range(len(data)):
-            if(isinstance(data[i], numpy.ndarray)):
-                array_list.append(data[i])
-                data[i] = '__ndarray__'
-            elif(isinstance(data[i], numpy.number)):
-                # JSON can't deal with numpy scalars
-                data[i] = data[i].item()
-        # Use the md5sum of the title as the key to avoid clashing
-        # keys, when one title is a substring or another title
-        # (e.g. "CCD" and "CCD1")
-        m = hashlib.md5()
-        m.update(bytes(title))
-        self._data_socket.send(m.digest(), zmq.SNDMORE)
-        if(len(array_list)):
-            self._data_socket.send_json(data, zmq.SNDMORE)
-        else:
-            self._data_socket.send_json(data)
-        for i in range(len(array_list)):
-            if(i != len(array_list)-1):
-                self._send_array(array_list[i], flags=zmq.SNDMORE)
-            else:
-                self._send_array(array_list[i])
+        send_message(self._data_socket, title, data)
     
     def _answer_command(self, stream, msg):
         """Reply to commands received on the _ctrl_stream"""
@@ -117,6 +85,8 @@ class ZmqServer(object):
             stream.socket.send_json(['data_port', bytes(self._broker_pub_port)])
         if(msg[0] == 'uuid'):
             stream.socket.send_json(['uuid', bytes(ipc.uuid)])
+        if(msg[0] == 'stats'):
+            stream.socket.send_json(['stats', ipc.stats.ranks])
         if(msg[0] == 'reload'):
             #TODO: Find a way to replace this with a direct function call (in all workers)
             stream.socket.send_json(['reload', bytes(True)])
@@ -149,3 +119,62 @@ class ZmqServer(object):
     @property
     def subscribed(self):
         return self._subscribed
+
+
+class ZmqPublisher(object):
+    """Publishes the data of a slave directly to the broker of the ZmqServer,
+    instead of sending it through the master using MPI.
+    Analysis users do not need to deal with it."""
+    def __init__(self, address):
+        self._context = zmq.Context()
+        self._data_socket = self._context.socket(zmq.PUB)
+        self._data_socket.setsockopt(zmq.SNDHWM, eventLimit)
+        self._data_socket.setsockopt(zmq.SNDTIMEO, 0)
+        self._data_socket.connect(address)
+
+    def send(self, title, data):
+        """Send a list of data items to the broadcast named title"""
+        send_message(self._data_socket, title, data)
+
+    def close(self, linger=1000):
+        """Close the socket, waiting up to linger ms for unsent data"""
+        self._data_socket.close(linger=linger)
+        self._context.term()
+
+def _send_array(socket, array, flags=0, copy=True, track=False):
+    """Send a numpy array with metadata"""
+    md = dict(
+        dtype=str(array.dtype),
+        shape=array.shape,
+        strides=array.strides,
+    )
+    if md['dtype'] == 'object':
+        raise ValueError('Cannot broadcast arrays with dtype=object')
+    socket.send_json(md, flags|zmq.SNDMORE)
+    return socket.send(array, flags, copy=copy, track=track)
+
+def send_message(socket, title, data):
+    """Send a list of data items to the broadcast named title on the given socket"""
+    array_list = []
+    for i in range(len(data)):
+        if(isinstance(data[i], numpy.ndarray)):
+            array_list.append(data[i])
+            data[i] = '__ndarray__'
+        elif(isinstance(data[i], numpy.number)):
+            # JSON can't deal with numpy scalars
+            data[i] = data[i].item()
+    # Use the md5sum of the title as the key to avoid clashing
+    # keys, when one title is a substring or another title
+    # (e.g. "CCD" and "CCD1")
+    m = hashlib.md5()
+    m.update(bytes(title))
+    socket.send(m.digest(), zmq.SNDMORE)
+    if(len(array_list)):
+        socket.send_json(data, zmq.SNDMORE)
+    else:
+        socket.send_json(data)
+    for i in range(len(array_list)):
+        if(i != len(array_list)-1):
+            _send_array(socket, array_list[i], flags=zmq.SNDMORE)
+        else:
+            _send_array(socket, array_list[i])
@@ -0,0 +1,85 @@
+# --------------------------------------------------------------------------------------
+# Copyright 2016, Benedikt J. Daurer, Filipe R.N.C. Maia, Max F. Hantke, Carl Nettelblad
+# Hummingbird is distributed under the terms of the Simplified BSD License.
+# -------------------------------------------------------------------------
+"""Keeps objects derived from files, like masks and geometries, across
+reloads of the configuration file.
+
+The configuration file is executed again on every reload, but this module
+is not. Objects loaded through it are therefore only read again when the
+underlying file changed, e.g.::
+
+    mask = utils.cache.load(this_dir + "/mask.h5", utils.reader.MaskReader, "data/data")
+"""
+import os
+import types
+import hashlib
+
+_cache = {}
+
+def load(filename, loader, *args, **kwargs):
+    """Returns ``loader(filename, *args, **kwargs)``, reusing the result of a
+    previous call with the same arguments as long as the file did not change.
+    The file is identified by its path, modification time and size.
+
+    Args:
+        :filename(str): The file to load
+        :loader:        Function or class that loads the file (e.g. ``utils.reader.MaskReader``)
+
+    All other arguments are passed on to the loader and have to be hashable.
+    """
+    st = os.stat(filename)
+    return _lookup(filename, (st.st_mtime, st.st_size), loader, args, kwargs)
+
+def load_by_content(filename, loader, *args, **kwargs):
+    """Same as :func:`load`, but identifies the file by the md5 of its content.
+    This is more expensive than :func:`load`, but also works on file systems
+    which do not preserve modification times."""
+    m = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            m.update(block)
+    return _lookup(filename, m.digest(), loader, args, kwargs)
+
+def clear():
+    """Forgets all the objects kept so far"""
+    _cache.clear()
+
+def _lookup(filename, file_id, loader, args, kwargs):
+    """Returns the cached result of the loader, calling it if needed"""
+    # Functions defined in the configuration file are new objects after every
+    # reload, so loaders are identified by name and code unless they are anonymous
+    name = getattr(loader, '__name__', None)
+    if name is None or name == '<lambda>':
+        loader_id = loader
+    else:
+        loader_id = (getattr(loader, '__module__', None), name, _code_digest(loader))
+    key = (loader_id, os.path.abspath(filename), args, tuple(sorted(kwargs.items())))
+    if key not in _cache or _cache[key][0] != file_id:
+        _cache[key] = (file_id, loader(filename, *args, **kwargs))
+    return _cache[key][1]
+
+def _code_digest(loader):
+    """Returns the md5 of the code of the loader, of all its methods if it
+    is a class, such that editing it in the configuration file is noticed"""
+    m = hashlib.md5()
+    if isinstance(loader, (type, types.ClassType)):
+        functions = [f for _, f in sorted(vars(loader).items())]
+    else:
+        functions = [loader]
+    for function in functions:
+        code = getattr(function, '__code__', None)
+        if code is not None:
+            _update_digest(m, code)
+    return m.digest()
+
+def _update_digest(m, code):
+    """Adds the instructions, names and constants of code to the md5 m"""
+    m.update(code.co_code)
+    m.update(repr(code.co_names))
+    for const in code.co_consts:
+        # Nested functions are code objects, whose repr holds their address
+        if isinstance(const, types.CodeType):
+            _update_digest(m, const)
+        else:
+            m.update(repr(const))
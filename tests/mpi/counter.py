@@ -0,0 +1,52 @@
+# Hit rate of workers which compute it only on some events. Every 4th hit
+# rate of rank 1 and every 2nd of rank 2 is a hit, so once the windows of
+# both are full the merged hit rate is (5 + 10)/(20 + 20) = 37.5 %. The
+# processing rate is measured with a clock advancing by 2 ms per event on
+# both, so the merged rate is exactly 1000 Hz.
+import itertools
+import ipc
+import analysis.event
+import analysis.hitfinding
+import numpy as np
+
+state = {}
+state['Facility'] = 'Dummy'
+state['Dummy'] = {
+    'Repetition Rate' : 1000,
+    'Data Sources': {
+        'size': {
+            'data': lambda: np.random.rand(),
+            'unit': '',
+            'type': 'parameters'
+        }
+    }
+}
+state['max_events'] = 300 + 100*ipc.mpi.rank
+state['reduce_interval'] = 0.01
+
+class FakeClock(object):
+    """Advances by 2 ms every time it is read"""
+    def __init__(self):
+        self.now = 0.
+    def __call__(self):
+        self.now += 0.002
+        return self.now
+
+analysis.event.processingRate.clock = FakeClock()
+
+events = itertools.count(1)
+calls = itertools.count(1)
+hit_every = 2 if ipc.mpi.rank == 2 else 4
+
+def onEvent(evt):
+    analysis.event.printProcessingRate()
+    rate = analysis.event.processingRate
+    if ipc.mpi.is_main_worker() and rate.count == 2*rate.window:
+        print "rate", rate.rate
+    if ipc.mpi.rank == 1 and next(events) % 3 == 0:
+        return
+    hit = next(calls) % hit_every == 0
+    analysis.hitfinding.hitrate(evt, hit, history=20)
+    counter = analysis.hitfinding.hitrate_counters['hitrate']
+    if ipc.mpi.is_main_worker() and counter.count == 2*counter.window:
+        print "hitrate", evt['analysis']['hitrate'].data
@@ -0,0 +1,10 @@
+# Hit rate computed on several threads of every worker
+execfile(__file__.replace('counter_threads.py', 'counter.py'))
+state['event_threads'] = 4
+if not ipc.mpi.thread_multiple():
+    # The worker would analyse the events without threads
+    print "no thread_multiple"
+# The threads add the values of neighbouring events in any order, so all
+# the values of rank 2 are hits and none of rank 1, a merged hit rate of
+# 20/(20 + 20) = 50 % whatever the order
+hit_every = 1 if ipc.mpi.rank == 2 else state['max_events'] + 1
@@ -0,0 +1,31 @@
+# Adds values to a windowed counter from several threads at once
+import threading
+import ipc
+import numpy as np
+
+state = {}
+state['Facility'] = 'Dummy'
+state['Dummy'] = {
+    'Repetition Rate' : 1000,
+    'Data Sources': {
+        'size': {
+            'data': lambda: np.random.rand(),
+            'unit': '',
+            'type': 'parameters'
+        }
+    }
+}
+state['max_events'] = 1
+
+def onEvent(evt):
+    counter = ipc.counter.WindowedCounter('window', window=5)
+    def add():
+        for i in range(10000):
+            counter.add(i % 2)
+    threads = [threading.Thread(target=add) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # The running sum has to match the values in the window
+    print "window", counter.count, int(counter.total), sum([v for v, _ in counter._values])
@@ -0,0 +1,26 @@
+# Gathers values of workers which processed different numbers of events
+import ipc
+import numpy as np
+
+state = {}
+state['Facility'] = 'Dummy'
+state['Dummy'] = {
+    'Repetition Rate' : 1000,
+    'Data Sources': {
+        'size': {
+            'data': lambda: np.random.rand(),
+            'unit': '',
+            'type': 'parameters'
+        }
+    }
+}
+# 65 events on rank 1, 90 on rank 2
+state['max_events'] = 40 + 25*ipc.mpi.rank
+state['reduction_file'] = 'gather.h5'
+
+sizes = []
+ipc.reduction.register('sizes', lambda: np.array(sizes), op='gather')
+ipc.reduction.register('ranks', lambda: np.array([ipc.mpi.rank]*len(sizes)), op='gather')
+
+def onEvent(evt):
+    sizes.append(evt['parameters']['size'].data)
@@ -0,0 +1,35 @@
+# Sums values of workers which wait for some sums and poll for others,
+# and process different numbers of events
+import ipc
+import numpy as np
+
+state = {}
+state['Facility'] = 'Dummy'
+state['Dummy'] = {
+    'Repetition Rate' : 1000,
+    'Data Sources': {
+        'size': {
+            'data': lambda: np.random.rand(),
+            'unit': '',
+            'type': 'parameters'
+        }
+    }
+}
+state['max_events'] = 50 + 100*ipc.mpi.rank
+state['reduce_interval'] = 0.01
+
+nr_events = 0
+polled = None
+
+def onEvent(evt):
+    global nr_events, polled
+    nr_events += 1
+    if polled is None:
+        polled = ipc.mpi.isum('polled', np.array([1, 2]))
+    elif polled.test():
+        if ipc.mpi.is_main_worker():
+            print "polled", polled.result[0], polled.result[1]
+        polled = None
+    waited = ipc.mpi.isum('waited', 1)
+    if nr_events % 10 == 0 and ipc.mpi.is_main_worker():
+        print "waited", waited.wait()
@@ -0,0 +1,36 @@
+# Sums values of workers which call periodic_sum in different orders,
+# some only on some events, and process different numbers of events
+import ipc
+import numpy as np
+
+state = {}
+state['Facility'] = 'Dummy'
+state['Dummy'] = {
+    'Repetition Rate' : 1000,
+    'Data Sources': {
+        'size': {
+            'data': lambda: np.random.rand(),
+            'unit': '',
+            'type': 'parameters'
+        }
+    }
+}
+state['max_events'] = 50 + 100*ipc.mpi.rank
+state['reduce_interval'] = 0.01
+
+nr_events = 0
+
+def onEvent(evt):
+    global nr_events
+    nr_events += 1
+    if ipc.mpi.rank == 1:
+        if nr_events % 3:
+            pair = ipc.mpi.periodic_sum('pair', np.array([1, 2]))
+        ones = ipc.mpi.periodic_sum('ones', 1)
+    else:
+        ones = ipc.mpi.periodic_sum('ones', 1)
+        pair = ipc.mpi.periodic_sum('pair', np.array([1, 2]))
+    if ipc.mpi.is_main_worker() and ones is not None:
+        print "ones", ones
+    if ipc.mpi.is_main_worker() and nr_events % 3 and pair is not None:
+        print "pair", pair[0], pair[1]
@@ -92,6 +92,50 @@ def test_hitfinding_example():
     run_example(conf=__thisdir__ + '/../examples/basic/hitfinding.py')
 def test_correlation_example():
     run_example(conf=__thisdir__ + '/../examples/basic/correlation.py')
+def test_batch_example():
+    run_example(conf=__thisdir__ + '/../examples/basic/batch.py')
+def test_bank_example():
+    run_example(conf=__thisdir__ + '/../examples/basic/bank.py')
+
+# Testing the translators reading files
+def write_example_conf(tmpdir, example, lines):
+    """Writes a configuration running the given example with the lines added"""
+    conf = tmpdir.join(os.path.basename(example))
+    conf.write("execfile(%r)\n" % (__thisdir__ + '/../examples/basic/' + example) +
+               "\n".join(lines) + "\n")
+    return str(conf)
+
+def test_replay_example(tmpdir):
+    import h5py
+    import numpy as np
+    with h5py.File(str(tmpdir.join('hits_001_00.h5')), 'w') as f:
+        f['entry_1/data'] = np.random.rand(10, 32, 32)
+        f['analysis/diameter'] = np.random.rand(10)
+        f['LCLS/timestamp'] = (1450000000 << 32) + np.arange(10, dtype=np.uint64)
+        f['LCLS/fiducial'] = np.arange(10, dtype=np.int32)
+        f['LCLS/run'] = np.ones(10, dtype=np.int32)
+    # Without event identifiers
+    with h5py.File(str(tmpdir.join('hits_002_00.h5')), 'w') as f:
+        f['entry_1/data'] = np.random.rand(5, 32, 32)
+        f['analysis/diameter'] = np.random.rand(5)
+    conf = write_example_conf(tmpdir, 'replay.py', [
+        "state['Replay']['Files'] = %r" % str(tmpdir.join('hits_*.h5')),
+        # A data source named like an event identifier
+        "state['Replay']['Data Sources']['run'] = "
+        "{'dataset': 'analysis/diameter', 'unit': 'm', 'type': 'parameters'}"])
+    run_example(conf=conf)
+
+def test_cxi_example(tmpdir):
+    import h5py
+    import numpy as np
+    with h5py.File(str(tmpdir.join('r0001.cxi')), 'w') as f:
+        # Compressed, such that the frames are read in whole chunks
+        f.create_dataset('entry_1/data_1/data', data=np.random.poisson(0.1, (10, 32, 32)),
+                         chunks=(4, 32, 32), compression='gzip')
+    conf = write_example_conf(tmpdir, 'cxi.py', [
+        "state['CXI']['Files'] = %r" % str(tmpdir.join('*.cxi')),
+        "state['CXI']['Block Size'] = 6"])
+    run_example(conf=conf)
 
 if __name__ == '__main__':
     #test_detector_example()
@@ -0,0 +1,95 @@
+import os
+import imp
+import distutils.spawn
+import subprocess32 as subprocess # backport of subprocess from python 3 to work with python 2.7
+import pytest
+
+__thisdir__ = os.path.dirname(os.path.realpath(__file__))
+# The environment before any test initialized MPI in this process, which
+# sets variables (e.g. OMPI_*) that would confuse mpirun
+__environ__ = dict(os.environ)
+
+def run_mpi(conf, cwd, nr_processes=3, timeout=60):
+    """Runs the backend with the given configuration on nr_processes MPI ranks,
+    in the directory cwd, and returns its output"""
+    mpirun = distutils.spawn.find_executable('mpirun')
+    if mpirun is None:
+        pytest.skip("mpirun not found")
+    # Importing mpi4py.MPI here would initialize MPI in the test process
+    try:
+        imp.find_module('mpi4py')
+    except ImportError:
+        pytest.skip("mpi4py not found")
+    cmd = [mpirun, '--allow-run-as-root', '--oversubscribe', '-n', str(nr_processes),
+           'python', __thisdir__ + '/../hummingbird.py', '-b', conf]
+    print "Running: ", " ".join(cmd)
+    # Pass the environment at start-up, without the variables set
+    # when another test initialized MPI in this process
+    p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         env=__environ__)
+    try:
+        output, error = p.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        p.kill()
+        output, error = p.communicate()
+        print output, error
+        assert False, "%s did not finish within %d s" % (conf, timeout)
+    print output, error
+    assert (p.returncode == 0), "%s did not finish successfully!" % (conf)
+    assert ('Error' not in error), "%s reported an error" % (conf)
+    return output
+
+def test_gather_unequal_lengths(tmpdir):
+    import h5py
+    run_mpi(__thisdir__ + '/mpi/gather.py', str(tmpdir))
+    with h5py.File(str(tmpdir.join('gather.h5')), 'r') as f:
+        assert f['sizes'].shape == (65 + 90,)
+        assert list(f['ranks'][:]) == [1]*65 + [2]*90
+
+def test_periodic_sum_any_order(tmpdir):
+    output = run_mpi(__thisdir__ + '/mpi/periodic.py', str(tmpdir))
+    ones = [l for l in output.splitlines() if l.startswith('ones')]
+    pairs = [l for l in output.splitlines() if l.startswith('pair')]
+    assert ones and pairs
+    assert set(ones) == set(['ones 2.0'])
+    assert set(pairs) == set(['pair 2.0 4.0'])
+
+def test_isum_test_and_wait(tmpdir):
+    output = run_mpi(__thisdir__ + '/mpi/isum.py', str(tmpdir))
+    polled = [l for l in output.splitlines() if l.startswith('polled')]
+    waited = [l for l in output.splitlines() if l.startswith('waited')]
+    assert polled and waited
+    assert set(polled) == set(['polled 2.0 4.0'])
+    assert set(waited) == set(['waited 2.0'])
+
+def check_counter_rates(output, hitrate):
+    """Checks the merged hit and processing rates printed by mpi/counter.py"""
+    lines = output.splitlines()
+    hitrates = [float(l.split()[1]) for l in lines if l.startswith('hitrate')]
+    rates = [float(l.split()[1]) for l in lines if l.startswith('rate')]
+    assert hitrates and rates
+    for value in hitrates:
+        assert abs(value - hitrate) < 1e-6
+    # The processing rate is measured with a fake clock
+    for rate in rates:
+        assert abs(rate - 1000.) < 1e-6
+
+def test_counter_conditional(tmpdir):
+    # Rank 1 skips hitrate() on every third event
+    output = run_mpi(__thisdir__ + '/mpi/counter.py', str(tmpdir))
+    check_counter_rates(output, 37.5)
+
+def test_counter_threads(tmpdir):
+    output = run_mpi(__thisdir__ + '/mpi/counter_threads.py', str(tmpdir))
+    if 'no thread_multiple' in output:
+        pytest.skip("MPI does not support THREAD_MULTIPLE")
+    check_counter_rates(output, 50.)
+
+def test_counter_window_threads(tmpdir):
+    # Importing ipc here would initialize MPI in the test process
+    output = run_mpi(__thisdir__ + '/mpi/counter_window.py', str(tmpdir), nr_processes=1)
+    counts = [l for l in output.splitlines() if l.startswith('window')]
+    assert counts
+    count, total, window_sum = counts[0].split()[1:]
+    assert int(count) == 5
+    assert total == window_sum